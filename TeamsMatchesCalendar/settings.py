@@ -85,6 +85,23 @@ DATABASES = {
 }
 
 
+# Caches
+# Fixtures are kept in a file cache, so all gunicorn workers share one fixture store
+# (see teams/utils/fixture_store.py); rendered page fragments stay in process memory.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fixtures': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('FIXTURES_CACHE_DIR', BASE_DIR / 'fixtures_cache'),
+        # a team takes up to 11 keys (entry and snapshots); the default of 300 culls entries after a few dozen teams
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -123,6 +140,9 @@ STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Resized team crests fetched from Transfermarkt (see teams/utils/logo_cache.py)
+LOGO_CACHE_DIR = os.environ.get('LOGO_CACHE_DIR', BASE_DIR / 'logo_cache')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -131,5 +151,16 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Google API credentials
 GOOGLE_CREDENTIALS_FILE = os.environ.get('GOOGLE_CREDENTIALS_PATH')
 
+# Calendar API base url override, e.g. 'http://127.0.0.1:9001/calendar/v3/' for stubs (default: Google's)
+GOOGLE_CALENDAR_API_ENDPOINT = os.environ.get('GOOGLE_CALENDAR_API_ENDPOINT')
+
+# Archive of fetched Transfermarkt pages for replaying parsers offline (see teams/utils/page_archive.py).
+# Archiving is off unless a directory is given.
+PAGE_ARCHIVE_DIR = os.environ.get('PAGE_ARCHIVE_DIR')
+
+# Google Calendar IDs per league name, for teams without their own calendar, e.g.
+# {'Premier League': '...@group.calendar.google.com'}
+CALENDAR_ROUTES = {}
+
 # Default Google Calendar ID
 CALENDAR_ID = 'a57171843bd9e8c3ffe4ba97716c76e722ce52747a2872d879ffc9914a8523e9@group.calendar.google.com'
@@ -0,0 +1,21 @@
+# gunicorn settings, picked up automatically from the working directory.
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', '1'))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+threads = int(os.environ.get('GUNICORN_THREADS', '1'))
+# workers silent for longer are killed; fixture fetches of a request stop well before it
+# (fixture_store.FETCH_BUDGET), so a slow Transfermarkt degrades pages instead of killing workers
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+
+# Load the app in the master process and warm the lazily imported libraries there,
+# so workers fork with them already in memory (shared copy-on-write).
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+
+def when_ready(server):
+    # runs in the master after the app is loaded, before workers are forked
+    if preload_app:
+        from teams.utils.preload import preload
+        preload()
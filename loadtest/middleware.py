@@ -0,0 +1,18 @@
+FAKE_GOOGLE_CREDS = {
+    'token': 'loadtest-token',
+    'refresh_token': 'loadtest-refresh',
+    'token_uri': 'https://oauth2.googleapis.com/token',
+    'client_id': 'loadtest',
+    'client_secret': 'loadtest',
+    'scopes': ['https://www.googleapis.com/auth/calendar.events'],
+    'expiry': None,
+}
+
+
+def fake_google_credentials(get_response):
+    """Give every session Google credentials, so calendar sync skips the OAuth consent."""
+    def middleware(request):
+        if 'google_creds' not in request.session:
+            request.session['google_creds'] = FAKE_GOOGLE_CREDS
+        return get_response(request)
+    return middleware
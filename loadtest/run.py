@@ -0,0 +1,215 @@
+"""
+Load test the app's views under gunicorn, against stub Transfermarkt and Calendar backends.
+
+For every worker class and worker count, starts gunicorn the way the Dockerfile does
+(gunicorn.conf.py, settings from loadtest/settings.py), drives each scenario with an
+asyncio HTTP client for a fixed time and reports p50/p95/p99 latency and requests/s.
+
+  python -m loadtest.run --worker-classes sync,gthread --workers 1,2,4 \\
+      --concurrency 20 --duration 15 --tm-latency 0.2 --calendar-latency 0.05
+
+Scenarios: team_list (GET /), tm_search (POST /search/), upcoming (GET /upcoming/),
+add_to_calendar (POST /add-to-calendar/, full sync every time).
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+from .stubs import start_stubs
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+SCENARIOS = {
+    'team_list': ('GET', '/', None),
+    'tm_search': ('POST', '/search/', {'q': 'club'}),
+    'upcoming': ('GET', '/upcoming/', None),
+    'add_to_calendar': ('POST', '/add-to-calendar/', {'calendar_id': '', 'full_sync': 'on'}),
+}
+OK_STATUSES = (200, 302, 304)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def http_request(port, method, path, form=None, cookies=None, timeout=30):
+    """Minimal HTTP/1.1 client (one connection per request). Returns (status, {cookie: value})."""
+    body = urlencode(form).encode('ascii') if form else b''
+    lines = [f"{method} {path} HTTP/1.1", f"Host: 127.0.0.1:{port}", "Connection: close"]
+    if cookies:
+        lines.append("Cookie: " + "; ".join(f"{k}={v}" for k, v in cookies.items()))
+    if form is not None:
+        lines += ["Content-Type: application/x-www-form-urlencoded", f"Content-Length: {len(body)}"]
+
+    async def exchange():
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body)
+            await writer.drain()
+            return await reader.read()
+        finally:
+            writer.close()
+
+    data = await asyncio.wait_for(exchange(), timeout)
+    head = data.split(b"\r\n\r\n", 1)[0].decode('latin-1').split("\r\n")
+    status = int(head[0].split()[1])
+    set_cookies = {}
+    for line in head[1:]:
+        name, _, value = line.partition(':')
+        if name.lower() == 'set-cookie':
+            cookie_name, _, cookie_value = value.strip().split(';', 1)[0].partition('=')
+            set_cookies[cookie_name] = cookie_value
+    return status, set_cookies
+
+
+async def run_scenario(port, scenario, teams_cookie, concurrency, duration):
+    """Run `concurrency` virtual users on one scenario for `duration` seconds."""
+    method, path, form = SCENARIOS[scenario]
+    latencies = []
+    errors = 0
+
+    async def virtual_user():
+        nonlocal errors
+        cookies = {'my_teams': teams_cookie}
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                status, set_cookies = await http_request(port, method, path, form, cookies)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            if status not in OK_STATUSES:
+                errors += 1
+            # keep session and messages cookies like a browser; the teams cookie stays as it is
+            for name, value in set_cookies.items():
+                if name == 'my_teams':
+                    continue
+                if value in ('', '""'):
+                    cookies.pop(name, None)
+                else:
+                    cookies[name] = value
+
+    # one warm-up request, so imports and first fetches don't count
+    await http_request(port, method, path, form, {'my_teams': teams_cookie}, timeout=120)
+    started = time.monotonic()
+    deadline = started + duration
+    await asyncio.gather(*(virtual_user() for _ in range(concurrency)))
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def start_gunicorn(worker_class, workers, threads, stub_base, fixtures_dir, fixtures_ttl):
+    port = _free_port()
+    env = dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE='loadtest.settings',
+        TRANSFERMARKT_BASE=stub_base,
+        TRANSFERMARKT_REQUEST_INTERVAL='0',
+        GOOGLE_CALENDAR_API_ENDPOINT=f"{stub_base}/calendar/v3/",
+        FIXTURES_CACHE_DIR=fixtures_dir,
+        LOADTEST_FIXTURES_TTL=str(fixtures_ttl),
+        GUNICORN_BIND=f"127.0.0.1:{port}",
+        GUNICORN_WORKER_CLASS=worker_class,
+        GUNICORN_WORKERS=str(workers),
+        GUNICORN_THREADS=str(threads),
+    )
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'TeamsMatchesCalendar.wsgi:application'],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {proc.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return proc, port
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("gunicorn did not start in 30s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--worker-classes', default='sync,gthread', help='Comma separated gunicorn worker classes')
+    parser.add_argument('--workers', default='1,2,4', help='Comma separated worker counts')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per worker (gthread)')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma separated scenarios')
+    parser.add_argument('--concurrency', type=int, default=20, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=15, help='Seconds per scenario')
+    parser.add_argument('--teams', type=int, default=5, help='Followed teams per user')
+    parser.add_argument('--tm-latency', type=float, default=0.2, help='Stub Transfermarkt latency (s)')
+    parser.add_argument('--calendar-latency', type=float, default=0.05, help='Stub Calendar API latency (s)')
+    parser.add_argument('--fixtures-ttl', type=float, default=900,
+                        help='Fixture store TTL (s); 0 re-fetches fixtures on every request')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(',')
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    stubs = start_stubs(0, args.tm_latency, args.calendar_latency)
+    stub_base = f"http://127.0.0.1:{stubs.server_address[1]}"
+    teams_cookie = json.dumps([
+        {'id': str(i), 'name': f"Club {i}", 'url': f"{stub_base}/club-{i}/startseite/verein/{i}",
+         'league': 'Stub League', 'logo': '', 'calendar_id': ''}
+        for i in range(1, args.teams + 1)
+    ], separators=(',', ':'))
+
+    results = []
+    print(f"{'class':<8} {'workers':>7} {'scenario':<16} {'requests':>8} {'errors':>6} "
+          f"{'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for worker_class in args.worker_classes.split(','):
+        for workers in (int(w) for w in args.workers.split(',')):
+            with tempfile.TemporaryDirectory() as fixtures_dir:
+                proc, port = start_gunicorn(worker_class, workers, args.threads, stub_base,
+                                            fixtures_dir, args.fixtures_ttl)
+                try:
+                    for scenario in scenarios:
+                        result = asyncio.run(run_scenario(port, scenario, teams_cookie, args.concurrency, args.duration))
+                        result.update({'worker_class': worker_class, 'workers': workers, 'scenario': scenario})
+                        results.append(result)
+                        print(f"{worker_class:<8} {workers:>7} {scenario:<16} {result['requests']:>8} "
+                              f"{result['errors']:>6} {result['rps']:>8.1f} {result['p50_ms']:>8.1f} "
+                              f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f}", flush=True)
+                finally:
+                    proc.terminate()
+                    proc.wait()
+    stubs.shutdown()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""
+Settings for running the app under load tests (see loadtest/run.py).
+The app's own settings, with the parts that need a browser or a database swapped out:
+sessions live in signed cookies, csrf checks are off and every session gets fake Google
+credentials, so the Calendar sync runs against the stubs without an OAuth round trip.
+Point Transfermarkt and the Calendar API at the stubs with TRANSFERMARKT_BASE and
+GOOGLE_CALENDAR_API_ENDPOINT.
+"""
+import os
+from TeamsMatchesCalendar.settings import *  # noqa: F401,F403
+
+SECRET_KEY = os.environ.get('SECRET_KEY') or 'loadtest-not-secret'
+DEBUG = False
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+MIDDLEWARE = [m for m in MIDDLEWARE if m != 'django.middleware.csrf.CsrfViewMiddleware']  # noqa: F405
+MIDDLEWARE.insert(MIDDLEWARE.index('django.contrib.sessions.middleware.SessionMiddleware') + 1,
+                  'loadtest.middleware.fake_google_credentials')
+
+# plain static storage, the manifest needs collectstatic
+STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fixtures': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('FIXTURES_CACHE_DIR', '/tmp/teams-loadtest-fixtures'),
+    },
+}
+FIXTURES_TTL = float(os.environ.get('LOADTEST_FIXTURES_TTL', '900'))
@@ -0,0 +1,130 @@
+"""
+Stub Transfermarkt and Google Calendar backends for load tests.
+
+Serves just enough html/json for the app's parsers and the Calendar client:
+  /schnellsuche/ergebnis/schnellsuche?query=...   search results with club links
+  /<slug>/startseite/verein/<id>                  club page
+  /<slug>/spielplandatum/verein/<id>              fixtures page
+  /calendar/v3/calendars/<id>/events[/<event>]    Calendar events list/insert/update/delete
+Every response is delayed by the configured latency, to mimic the real services.
+
+Run standalone with: python -m loadtest.stubs --port 9001 --tm-latency 0.3
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+SEARCH_RESULTS = 5
+FIXTURES_PER_TEAM = 8
+
+
+def club_page(slug, team_id):
+    return f"""<html><head><title>{slug} - Transfermarkt</title>
+<link rel="canonical" href="/{slug}/startseite/verein/{team_id}"></head><body>
+<h1>Club {team_id}</h1>
+<img alt="Club {team_id}" src="https://tmssl.akamaized.net/images/wappen/head/{team_id}.png">
+<div class="data-header__club-info"><span class="data-header__club"><a href="/liga/startseite/wettbewerb/L1">Stub League</a></span></div>
+</body></html>"""
+
+def fixtures_page(slug, team_id):
+    rows = ['<tr><td><img title="Stub League"></td></tr>']
+    today = datetime.now()
+    for i in range(FIXTURES_PER_TEAM):
+        day = today + timedelta(days=3 * i + 1)
+        opponent = (team_id + i + 1) % 1000
+        rows.append(
+            f'<tr><td></td><td>{day:%a %d/%m/%y}</td><td>{(i % 9) + 1}:30 PM</td><td>{"H" if i % 2 else "A"}</td>'
+            f'<td></td><td></td><td><a href="/club-{opponent}/startseite/verein/{opponent}">Club {opponent}</a></td>'
+            f'<td></td><td></td><td><a title="Match preview" href="/spielbericht/index/spielbericht/{team_id}{i}">-:-</a></td></tr>'
+        )
+    return f"""<html><body>
+<div class="data-header__headline-container"><h1>Club {team_id}</h1></div>
+<div class="responsive-table"><table><tbody>{''.join(rows)}</tbody></table></div>
+</body></html>"""
+
+def search_page():
+    links = ''.join(f'<a href="/club-{i}/startseite/verein/{i}">Club {i}</a>' for i in range(1, SEARCH_RESULTS + 1))
+    return f"<html><body>{links}</body></html>"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    tm_latency = 0.0
+    calendar_latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _calendar(self):
+        time.sleep(self.calendar_latency)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}') if length else {}
+        if self.command == 'GET':
+            return self._send(200, json.dumps({'items': []}), 'application/json')
+        if self.command == 'DELETE':
+            return self._send(204, '', 'application/json')
+        body.setdefault('id', uuid.uuid4().hex)
+        return self._send(200, json.dumps(body), 'application/json')
+
+    def _transfermarkt(self, path):
+        time.sleep(self.tm_latency)
+        if path.startswith('/schnellsuche/'):
+            return self._send(200, search_page(), 'text/html')
+        m = re.match(r'^/([^/]+)/(startseite|spielplandatum)/verein/(\d+)', path)
+        if not m:
+            return self._send(404, 'not found', 'text/plain')
+        slug, page, team_id = m.group(1), m.group(2), int(m.group(3))
+        html = club_page(slug, team_id) if page == 'startseite' else fixtures_page(slug, team_id)
+        return self._send(200, html, 'text/html')
+
+    def _handle(self):
+        path = urlparse(self.path).path
+        if path.startswith('/calendar/'):
+            return self._calendar()
+        return self._transfermarkt(path)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+
+def start_stubs(port=0, tm_latency=0.0, calendar_latency=0.0):
+    """Start the stub server in a background thread. Returns the server (server.server_address has the port)."""
+    handler = type('ConfiguredStubHandler', (StubHandler,), {
+        'tm_latency': tm_latency,
+        'calendar_latency': calendar_latency,
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=9001)
+    parser.add_argument('--tm-latency', type=float, default=0.0, help='Transfermarkt response delay (s)')
+    parser.add_argument('--calendar-latency', type=float, default=0.0, help='Calendar API response delay (s)')
+    args = parser.parse_args()
+    server = start_stubs(args.port, args.tm_latency, args.calendar_latency)
+    print(f"Stubs listening on http://127.0.0.1:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,3 +2,9 @@ from django import forms
 
 class TeamSearchForm(forms.Form):
     q = forms.CharField(label='Team name', max_length=200)
+
+class BulkImportForm(forms.Form):
+    entries = forms.CharField(
+        label='Transfermarkt urls, team ids or competition urls (one per line), or an exported teams file',
+        widget=forms.Textarea(attrs={'rows': 6}),
+    )
@@ -0,0 +1,51 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from teams.utils import fixture_store
+from teams.utils.page_archive import PageArchive, get_default_archive
+from teams.utils.pipeline import parse_archived_pages
+from teams.utils.transfermarkt import filter_upcoming, _extract_team_id_from_url
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-run the Transfermarkt parsers over the latest archived copy of every page "
+        "and rebuild the fixture store from them, without touching the network."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archive', help='Archive directory (defaults to settings.PAGE_ARCHIVE_DIR)')
+        parser.add_argument('--dry-run', action='store_true', help='Only parse, do not write the fixture store')
+        parser.add_argument('--processes', type=int, default=None, help='Parser processes (defaults to CPU count)')
+
+    def handle(self, *args, **options):
+        archive = PageArchive(options['archive']) if options['archive'] else get_default_archive()
+        if archive is None:
+            raise CommandError('No archive: set PAGE_ARCHIVE_DIR or pass --archive.')
+
+        started = time.monotonic()
+        parsed = []
+        failed = []
+        for url, fetched_at, result in parse_archived_pages(archive, archive.latest(), options['processes']):
+            if isinstance(result, Exception):
+                failed.append((url, result))
+            elif result:
+                parsed.append((fetched_at, result))
+        elapsed = time.monotonic() - started
+
+        clubs = {_extract_team_id_from_url(club_url)
+                 for _, (kind, club_url, data) in parsed if kind == 'club' and data}
+
+        fixtures_pages = [(fetched_at, club_url, matches)
+                          for fetched_at, (kind, club_url, matches) in parsed if kind == 'fixtures']
+        if not options['dry_run']:
+            for fetched_at, club_url, matches in fixtures_pages:
+                fixture_store.store_team_fixtures({'url': club_url}, filter_upcoming(matches), fetched_at)
+
+        pages = len(parsed) + len(failed)
+        rate = pages / elapsed if elapsed else 0
+        self.stdout.write(
+            f"Parsed {pages} pages in {elapsed:.2f}s ({rate:.1f} pages/s): "
+            f"{len(clubs)} clubs, {len(fixtures_pages)} fixture pages, {len(failed)} failed."
+        )
+        for url, e in failed:
+            self.stderr.write(f"Failed: {url}: {e}")
@@ -0,0 +1,38 @@
+import time
+from django.core.management.base import BaseCommand
+from teams.utils import cookie_storage
+from teams.utils.transfermarkt import resolve_clubs, BULK_WORKERS
+
+
+class Command(BaseCommand):
+    help = (
+        "Resolve many clubs at once from Transfermarkt urls, team ids or competition urls "
+        "and print them as a teams export, ready for the bulk import form."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('entries', nargs='*', help='Club urls, team ids or competition (/wettbewerb/) urls')
+        parser.add_argument('--file', help='Read entries from a file, one per line')
+        parser.add_argument('--workers', type=int, default=BULK_WORKERS, help='Concurrent club lookups')
+        parser.add_argument('--output', '-o', help='Write the export to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        entries = list(options['entries'])
+        if options['file']:
+            with open(options['file'], encoding='utf-8') as f:
+                entries.extend(f.read().splitlines())
+
+        started = time.monotonic()
+        clubs, failed = resolve_clubs(entries, max_workers=options['workers'])
+        elapsed = time.monotonic() - started
+
+        export = cookie_storage.export_teams(clubs)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(export)
+        else:
+            self.stdout.write(export)
+
+        self.stderr.write(f"Resolved {len(clubs)} clubs in {elapsed:.1f}s")
+        for entry in failed:
+            self.stderr.write(f"Could not resolve: {entry}")
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from teams.utils import fixture_store
+from teams.utils.pipeline import run_pipeline, fixtures_tasks
+from teams.utils.transfermarkt import BULK_WORKERS, expand_bulk_entries, filter_upcoming, _extract_team_id_from_url
+
+
+class Command(BaseCommand):
+    help = (
+        "Fetch and parse fixtures of many clubs (urls, team ids or competition urls) "
+        "through the bulk pipeline and store them in the fixture store."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('entries', nargs='*', help='Club urls, team ids or competition (/wettbewerb/) urls')
+        parser.add_argument('--file', help='Read entries from a file, one per line')
+        parser.add_argument('--fetchers', type=int, default=BULK_WORKERS, help='Concurrent page fetches')
+        parser.add_argument('--processes', type=int, default=None, help='Parser processes (defaults to CPU count)')
+
+    def handle(self, *args, **options):
+        entries = list(options['entries'])
+        if options['file']:
+            with open(options['file'], encoding='utf-8') as f:
+                entries.extend(f.read().splitlines())
+
+        club_urls, invalid = expand_bulk_entries(entries)
+        for entry in invalid:
+            self.stderr.write(f"Skipped: {entry}")
+
+        results, failed, stats = run_pipeline(
+            fixtures_tasks(club_urls), fetch_workers=options['fetchers'], processes=options['processes'])
+
+        club_url_by_id = {_extract_team_id_from_url(u): u for u in club_urls}
+        matches_count = 0
+        for (_, _, team_id, _), matches in results:
+            upcoming = filter_upcoming(matches)
+            matches_count += len(upcoming)
+            fixture_store.store_team_fixtures({'url': club_url_by_id[team_id]}, upcoming)
+
+        self.stdout.write(
+            f"Fetched {stats['pages']} pages ({stats['bytes'] / 1024:.0f} KiB) in {stats['elapsed']:.1f}s, "
+            f"{stats['pages_per_second']:.2f} pages/s; stored {matches_count} upcoming matches "
+            f"of {len(results)} clubs, {len(failed)} failed."
+        )
+        for (_, url, _, _), e in failed:
+            self.stderr.write(f"Failed: {url}: {e}")
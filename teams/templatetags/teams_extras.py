@@ -0,0 +1,30 @@
+from urllib.parse import urlencode
+from django import template
+from django.urls import reverse
+from django.utils import timezone
+from ..utils import logo_cache
+
+register = template.Library()
+
+
+@register.filter
+def logo_thumb(url, size=80):
+    """
+    Point a remote crest url at its cached thumbnail (teams:logo_file),
+    or at the logo proxy (teams:logo) that caches it and redirects there.
+    """
+    if not url:
+        return ''
+    digest = logo_cache.cached_digest(url, size) if logo_cache.is_allowed_logo_url(url) else None
+    if digest:
+        return reverse('teams:logo_file', args=[digest])
+    return f"{reverse('teams:logo', args=[size])}?{urlencode({'url': url})}"
+
+
+@register.filter
+def kickoff(match):
+    """Kickoff of a match in the current time zone: 'Y-m-d H:i', or 'Y-m-d (time TBC)' while its time is unknown."""
+    when = timezone.localtime(match['datetime'])
+    if not match.get('time_known', True):
+        return f"{when:%Y-%m-%d} (time TBC)"
+    return f"{when:%Y-%m-%d %H:%M}"
@@ -1,3 +1,4 @@
+import os
 from django.test import SimpleTestCase
 from datetime import datetime, timezone
 
@@ -37,3 +38,488 @@ class utils(SimpleTestCase):
         # CET (UTC+1)
         expected = datetime(2025, 11, 9, 16, 30, tzinfo=timezone.utc)
         self.assertEqual(process_datetime(date_str, time_str), expected)
+
+    def test_expand_bulk_entries(self):
+        from teams.utils.transfermarkt import expand_bulk_entries
+
+        club_urls, invalid = expand_bulk_entries([
+            'https://www.transfermarkt.com/fc-barcelona/startseite/verein/131',
+            'https://www.transfermarkt.com/fc-barcelona/spielplandatum/verein/131/saison_id/2025',
+            '418',
+            '',
+            'not a club',
+        ])
+        self.assertEqual(club_urls, [
+            'https://www.transfermarkt.com/fc-barcelona/startseite/verein/131',
+            'https://www.transfermarkt.com/-/startseite/verein/418',
+        ])
+        self.assertEqual(invalid, ['not a club'])
+
+    def test_export_and_import_teams(self):
+        from teams.utils import cookie_storage
+
+        teams = []
+        cookie_storage.add_team(teams, 'FC Barcelona', 'https://www.transfermarkt.com/fc-barcelona/startseite/verein/131', 'LaLiga', '')
+        exported = cookie_storage.export_teams(teams)
+        records = cookie_storage.parse_exported_teams(exported)
+        self.assertEqual(records[0]['name'], 'FC Barcelona')
+        self.assertNotIn('id', records[0])
+        self.assertIsNone(cookie_storage.parse_exported_teams('131\n418'))
+
+        self.assertEqual(cookie_storage.add_teams(teams, records), 0)
+        self.assertEqual(cookie_storage.add_teams([], records), 1)
+
+        # the same club under another url (as built from a bare team id) is a duplicate
+        _, created = cookie_storage.add_team(teams, 'Barça', 'https://www.transfermarkt.com/-/startseite/verein/131', 'LaLiga', '')
+        self.assertFalse(created)
+        self.assertEqual(len(teams), 1)
+
+    def test_teams_cookie(self):
+        import json
+        from django.http import HttpResponse
+        from teams.utils import cookie_storage
+
+        league = [{'name': f'Club {i}', 'url': f'https://www.transfermarkt.com/club-{i}/startseite/verein/{1000 + i}',
+                   'league': 'LaLiga', 'logo': f'https://tmssl.akamaized.net/images/wappen/head/{1000 + i}.png?lm=1406739548'}
+                  for i in range(20)]
+        teams = []
+        cookie_storage.add_teams(teams, league)
+        response = HttpResponse()
+        self.assertTrue(cookie_storage.save_teams(response, teams))
+        cookie = response.cookies[cookie_storage.COOKIE_NAME]
+        self.assertLess(len(cookie.output()), 4096)
+        self.assertEqual(cookie_storage.decode_teams(cookie.value), teams)
+        self.assertEqual(teams[0]['id'], '1000')
+
+        # cookies written as plain JSON are still read
+        self.assertEqual(cookie_storage.decode_teams(json.dumps(teams)), teams)
+
+        too_many = [dict(t, name=os.urandom(40).hex()) for t in league * 10]
+        response = HttpResponse()
+        self.assertFalse(cookie_storage.save_teams(response, too_many))
+        self.assertNotIn(cookie_storage.COOKIE_NAME, response.cookies)
+
+    def test_logo_thumbnail_cache(self):
+        import io
+        import tempfile
+        from unittest import mock
+        from PIL import Image
+        from django.test import override_settings
+        from teams.utils import logo_cache
+
+        crest = io.BytesIO()
+        Image.new('RGBA', (200, 160), (255, 0, 0, 255)).save(crest, format='PNG')
+        url = 'https://tmssl.akamaized.net/images/wappen/head/131.png'
+
+        with tempfile.TemporaryDirectory() as tmp, override_settings(LOGO_CACHE_DIR=tmp), \
+                mock.patch.object(logo_cache, '_fetch_logo', return_value=crest.getvalue()) as fetch:
+            digest = logo_cache.get_thumbnail(url, 40)
+            self.assertEqual(logo_cache.get_thumbnail(url, 40), digest)
+            # query strings and doubled slashes don't make new cache entries
+            self.assertEqual(logo_cache.get_thumbnail(url.replace('/images', '//images') + '?lm=1406739548', 40), digest)
+            self.assertEqual(fetch.call_count, 1)
+            with Image.open(logo_cache.logo_path(digest)) as thumb:
+                self.assertEqual(thumb.size, (40, 32))
+
+            with mock.patch.object(logo_cache, 'MAX_CACHED_LOGOS', 1):
+                self.assertRaises(logo_cache.LogoCacheFull, logo_cache.get_thumbnail, url, 80)
+
+        self.assertFalse(logo_cache.is_allowed_logo_url('http://127.0.0.1/logo.png'))
+
+    def test_fixture_store_versions(self):
+        from unittest import mock
+        from django.test import override_settings
+        from teams.utils import fixture_store
+
+        team = {'name': 'FC Barcelona', 'url': 'https://www.transfermarkt.com/fc-barcelona/startseite/verein/131'}
+        match = {'home': 'FC Barcelona', 'away': 'Real Madrid', 'datetime': datetime(2025, 10, 26, 15, 15, tzinfo=timezone.utc)}
+        caches = {'fixtures': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+        with override_settings(CACHES=caches), mock.patch.object(fixture_store, 'FIXTURES_TTL', 0), \
+                mock.patch.object(fixture_store, 'fetch_upcoming_matches_for_team', return_value=[match]) as fetch:
+            first = fixture_store.get_team_fixtures(team)
+            self.assertEqual(fixture_store.get_team_fixtures(team)['version'], first['version'])
+            # the same fixtures stored by warming or replaying (other team names) are no new version
+            fixture_store.store_team_fixtures(team, [dict(match, team_name='')])
+            self.assertEqual(fixture_store.store_team_fixtures(team, [dict(match, team_name='Barça')])['version'], first['version'])
+
+            fetch.return_value = [dict(match, datetime=datetime(2025, 10, 26, 20, 0, tzinfo=timezone.utc))]
+            _, entries = fixture_store.get_fixtures_for_teams([team])
+            self.assertNotEqual(entries['team:131']['version'], first['version'])
+            self.assertEqual(entries['team:131']['history'], [first['version'], entries['team:131']['version']])
+            self.assertEqual(fixture_store.get_snapshot(team, first['version']), [match])
+            self.assertNotEqual(fixture_store.fixtures_fingerprint(entries), fixture_store.fixtures_fingerprint({'team:131': first}))
+
+            # an entry lost to cache culling starts over without reusing a version id of other fixtures
+            fixture_store._store().clear()
+            fetch.return_value = [match]
+            self.assertEqual(fixture_store.get_team_fixtures(team)['version'], first['version'])
+            fetch.return_value = [dict(match, away='Atlético Madrid')]
+            self.assertNotEqual(fixture_store.get_team_fixtures(team)['version'], entries['team:131']['version'])
+
+    def test_calendar_service_reuse(self):
+        from teams.utils import google_calendar
+
+        creds_data = {
+            'token': 'token', 'refresh_token': 'refresh', 'token_uri': 'https://oauth2.googleapis.com/token',
+            'client_id': 'client', 'client_secret': 'secret', 'scopes': google_calendar.SCOPES,
+            'expiry': '2030-01-01T00:00:00',
+        }
+        creds = google_calendar.credentials_from_session(creds_data)
+        self.assertIs(google_calendar.credentials_from_session(dict(creds_data, token='older')), creds)
+        self.assertEqual(creds.expiry, datetime(2030, 1, 1))
+
+        service = google_calendar.get_calendar_service(creds)
+        self.assertIs(google_calendar.get_calendar_service(creds), service)
+        self.assertTrue(hasattr(service, 'events'))
+
+        # syncs run on long-lived threads, so later syncs reuse the services built by earlier ones
+        from unittest import mock
+        from teams.utils import calendar_sync
+        used = []
+        def create_events(credentials, matches, **kwargs):
+            used.append(google_calendar.get_calendar_service(credentials))
+            return []
+        plan = {'primary': {'matches': [], 'moved': [], 'cancelled': []}}
+        with mock.patch.object(calendar_sync, 'create_events_for_matches', side_effect=create_events):
+            calendar_sync.sync_calendars(creds, plan)
+            calendar_sync.sync_calendars(creds, plan)
+        self.assertIs(used[0], used[1])
+
+        # a calendar failing on the transport doesn't fail the others
+        import socket
+        def flaky(credentials, matches, calendar_id, **kwargs):
+            if calendar_id == 'broken':
+                raise socket.timeout('timed out')
+            return [{'action': 'created'}]
+        plan = dict(plan, broken={'matches': [], 'moved': [], 'cancelled': []})
+        with mock.patch.object(calendar_sync, 'create_events_for_matches', side_effect=flaky):
+            summaries = calendar_sync.sync_calendars(creds, plan)
+        self.assertEqual(summaries['primary']['created'], 1)
+        self.assertEqual(summaries['broken']['error'], 'timed out')
+
+    def test_plan_calendar_sync(self):
+        from django.test import override_settings
+        from teams.utils.calendar_sync import plan_calendar_sync
+
+        barca = {'name': 'FC Barcelona', 'url': 'https://www.transfermarkt.com/fc-barcelona/startseite/verein/131', 'league': 'LaLiga', 'calendar_id': ''}
+        real = {'name': 'Real Madrid', 'url': 'https://www.transfermarkt.com/real-madrid/startseite/verein/418', 'league': 'LaLiga', 'calendar_id': ''}
+        city = {'name': 'Manchester City', 'url': 'https://www.transfermarkt.com/manchester-city/startseite/verein/281', 'league': 'Premier League', 'calendar_id': 'city'}
+        clasico = {'home': 'FC Barcelona', 'away': 'Real Madrid', 'url': 'clasico', 'datetime': datetime(2025, 10, 26, 15, 15, tzinfo=timezone.utc)}
+        derby = {'home': 'Manchester City', 'away': 'Manchester United', 'url': 'derby', 'datetime': datetime(2025, 10, 25, 12, 0, tzinfo=timezone.utc)}
+        entries = {
+            'team:131': {'matches': [clasico], 'version': 1},
+            'team:418': {'matches': [clasico], 'version': 1},
+            'team:281': {'matches': [derby], 'version': 1},
+        }
+
+        with override_settings(CALENDAR_ROUTES={'LaLiga': 'laliga'}):
+            plan = plan_calendar_sync([barca, real, city], entries, default_calendar_id='primary')
+        self.assertEqual(plan, {'laliga': {'matches': [clasico], 'moved': [], 'cancelled': []}, 'city': {'matches': [derby], 'moved': [], 'cancelled': []}})
+
+        plan = plan_calendar_sync([barca, real, city], entries, default_calendar_id='primary')
+        self.assertEqual(plan, {'primary': {'matches': [clasico], 'moved': [], 'cancelled': []}, 'city': {'matches': [derby], 'moved': [], 'cancelled': []}})
+
+        # already synced at the current version: nothing to do
+        synced = {'primary': {'team:131': 1, 'team:418': 1}, 'city': {'team:281': 1}}
+        self.assertEqual(plan_calendar_sync([barca, real, city], entries, default_calendar_id='primary', synced=synced), {})
+
+        # a match moved by more than a day: its event is found at the old kickoff and updated, not inserted again
+        from unittest import mock
+        from teams.utils import calendar_sync, google_calendar
+        postponed = dict(clasico, datetime=datetime(2025, 11, 5, 20, 0, tzinfo=timezone.utc))
+        with mock.patch.object(calendar_sync, 'get_snapshot', return_value=[clasico]):
+            plan = plan_calendar_sync([barca], {'team:131': {'matches': [postponed], 'version': 2}},
+                                      synced={'primary': {'team:131': 1}})
+        self.assertEqual(plan, {'primary': {'matches': [], 'moved': [(clasico, postponed)], 'cancelled': []}})
+
+        service = mock.MagicMock()
+        events = service.events.return_value
+        events.list.return_value.execute.return_value = {'items': [
+            {'id': 'e1', 'summary': 'FC Barcelona - Real Madrid', 'start': {'dateTime': clasico['datetime'].isoformat()}}]}
+        events.update.return_value.execute.return_value = {'id': 'e1'}
+        with mock.patch.object(google_calendar, 'get_calendar_service', return_value=service):
+            results = google_calendar.create_events_for_matches(None, [], moved=plan['primary']['moved'])
+        self.assertEqual(results, [{'action': 'updated', 'id': 'e1', 'summary': 'FC Barcelona - Real Madrid'}])
+        self.assertEqual(events.list.call_args.kwargs['timeMin'], '2025-10-25T15:15:00+00:00')
+        self.assertEqual(events.update.call_args.kwargs['body']['start'], {'dateTime': postponed['datetime'].isoformat()})
+        events.insert.assert_not_called()
+
+    def test_page_archive(self):
+        import tempfile
+        from teams.utils.page_archive import PageArchive
+
+        with tempfile.TemporaryDirectory() as tmp:
+            archive = PageArchive(tmp)
+            url = 'https://www.transfermarkt.com/fc-barcelona/spielplandatum/verein/131'
+            first = archive.store(url, '<html>fixtures</html>', fetched_at=1000)
+            archive.store('https://www.transfermarkt.com/fc-barcelona/startseite/verein/131', '<html>club</html>', fetched_at=1001)
+            self.assertEqual(archive.store(url, '<html>fixtures</html>', fetched_at=1002), first)
+
+            self.assertEqual(archive.lookup(url), [(1000.0, first), (1002.0, first)])
+            self.assertEqual(archive.load(first), '<html>fixtures</html>')
+            self.assertEqual(len(archive.latest()), 2)
+            self.assertEqual(archive.lookup('https://www.transfermarkt.com/other'), [])
+
+    def test_parse_archived_fixtures_page(self):
+        from teams.utils.transfermarkt import parse_archived_page, process_datetime
+
+        def row(date, time_str, title):
+            return (
+                f'<tr><td></td><td>{date}</td><td>{time_str}</td><td>H</td><td></td><td></td>'
+                f'<td><a href="/real-madrid/startseite/verein/418">Real Madrid</a></td><td></td><td></td>'
+                f'<td><a title="{title}" href="/spielbericht/index/spielbericht/1">-:-</a></td></tr>'
+            )
+        html = (
+            '<div class="data-header__headline-container"><h1>FC Barcelona</h1></div>'
+            '<div class="responsive-table"><table><tbody>'
+            '<tr><td><img title="LaLiga"></td></tr>'
+            + row('Sun 26/10/25', '4:15 PM', 'Match preview')
+            + row('Sun 02/11/25', 'Unknown', 'Match preview')
+            + row('Sun 19/10/25', '2:00 PM', 'Match report')
+            + '</tbody></table></div>'
+        )
+        kind, club_url, matches = parse_archived_page('https://www.transfermarkt.com/fc-barcelona/spielplandatum/verein/131', html)
+        self.assertEqual(kind, 'fixtures')
+        self.assertEqual(club_url, 'https://www.transfermarkt.com/fc-barcelona/startseite/verein/131')
+        self.assertEqual(len(matches), 2)
+        self.assertEqual([m['time_known'] for m in matches], [True, False])
+        self.assertEqual(matches[0]['home'], 'FC Barcelona')
+        self.assertEqual(matches[0]['away'], 'Real Madrid')
+        self.assertEqual(matches[0]['league'], 'LaLiga')
+        self.assertEqual(matches[0]['team_id'], 131)
+        self.assertEqual(matches[0]['datetime'], process_datetime('Sun 26/10/25', '4:15 PM'))
+
+    def test_run_pipeline(self):
+        from unittest import mock
+        from teams.utils import pipeline
+
+        club_url = 'https://www.transfermarkt.com/fc-barcelona/startseite/verein/131'
+        pages = {club_url: '<html><h1>FC Barcelona</h1></html>'}
+        tasks = pipeline.club_tasks([club_url]) + pipeline.fixtures_tasks([club_url])
+        self.assertEqual(tasks[1][1], 'https://www.transfermarkt.com/fc-barcelona/spielplandatum/verein/131')
+
+        with mock.patch.object(pipeline, '_safe_get', side_effect=lambda url: pages[url]):
+            results, failed, stats = pipeline.run_pipeline(tasks, fetch_workers=2, processes=1)
+        self.assertEqual([record['name'] for _, record in results], ['FC Barcelona'])
+        self.assertEqual(failed[0][0], tasks[1])
+        self.assertEqual(stats['pages'], 1)
+
+    def test_lazy_heavy_imports(self):
+        import subprocess
+        import sys
+        from django.conf import settings
+
+        # importing the url conf (and with it all views) must not pull in the heavy libraries,
+        # they are imported by the code paths that use them
+        script = (
+            "import sys, django\n"
+            "django.setup()\n"
+            "import teams.urls\n"
+            "print(','.join(m for m in %r if m in sys.modules))\n"
+        ) % (('bs4', 'requests', 'tzlocal', 'PIL', 'httplib2', 'googleapiclient', 'google_auth_oauthlib'),)
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='TeamsMatchesCalendar.settings', SECRET_KEY='import-time')
+        out = subprocess.run([sys.executable, '-c', script], cwd=settings.BASE_DIR, env=env,
+                             capture_output=True, text=True, check=True).stdout
+        self.assertEqual(out.strip(), '')
+
+    def test_diff_fixtures(self):
+        from teams.utils import fixture_store
+
+        now = datetime(2025, 10, 20, tzinfo=timezone.utc)
+        def match(url, day, hour=0, time_known=True):
+            return {'home': 'FC Barcelona', 'away': url, 'url': url, 'time_known': time_known,
+                    'datetime': datetime(2025, 10, day, hour, tzinfo=timezone.utc)}
+
+        old = [match('moved', 25, 15), match('tbc', 26, time_known=False), match('cancelled', 27, 18),
+               match('played', 19, 18), match('same', 28, 20)]
+        new = [match('moved', 25, 20), match('tbc', 26, 16), match('same', 28, 20), match('new', 29, 21)]
+        diff = fixture_store.diff_fixtures(old, new, now=now)
+
+        self.assertEqual([m['url'] for m in diff['new']], ['new'])
+        self.assertEqual([(o['datetime'].hour, n['datetime'].hour) for o, n in diff['moved']], [(15, 20)])
+        self.assertEqual([m['url'] for m in diff['confirmed']], ['tbc'])
+        self.assertEqual([m['url'] for m in diff['cancelled']], ['cancelled'])
+        items = fixture_store.describe_changes(diff)
+        self.assertEqual([i['kind'] for i in items], ['New', 'Moved', 'Kickoff confirmed', 'Cancelled'])
+        self.assertEqual(items[1]['previous']['datetime'].hour, 15)
+
+        # kickoffs are shown in the active time zone, like the matches table
+        from django.utils import timezone as django_timezone
+        from teams.templatetags.teams_extras import kickoff
+        summer = {'datetime': datetime(2030, 7, 1, 18, 0, tzinfo=timezone.utc)}
+        with django_timezone.override('Europe/Warsaw'):
+            self.assertEqual(kickoff(summer), '2030-07-01 20:00')
+            self.assertEqual(kickoff(dict(summer, time_known=False)), '2030-07-01 (time TBC)')
+
+        # old changes drop out of the digest
+        entry = {'changes': diff, 'updated_at': now.timestamp()}
+        self.assertEqual(len(fixture_store.merge_changes({'t': entry}, now=now.timestamp() + 60)['new']), 1)
+        self.assertEqual(fixture_store.merge_changes({'t': entry}, now=now.timestamp() + fixture_store.CHANGES_MAX_AGE), fixture_store.empty_diff())
+
+    def test_sized_cache(self):
+        from teams.utils.sized_cache import SizedCache, approx_size
+
+        record = {'name': 'FC Barcelona', 'url': 'https://www.transfermarkt.com/fc-barcelona/startseite/verein/131', 'league': 'LaLiga', 'logo': ''}
+        cache = SizedCache(max_bytes=approx_size(record) * 2, ttl=60)
+        cache.set('a', record)
+        cache.set('b', dict(record))
+        self.assertIsNotNone(cache.get('a'))
+        cache.set('c', dict(record))  # over the byte budget: least recently used 'b' goes
+        self.assertIsNone(cache.get('b'))
+        cache.set('huge', {'data': 'x' * 10000})  # larger than the whole cache: not kept
+        self.assertIsNone(cache.get('huge'))
+
+        stats = cache.stats()
+        self.assertEqual(stats['entries'], 2)
+        self.assertLessEqual(stats['bytes'], stats['max_bytes'])
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+    def test_parse_club_page_fetches_once(self):
+        from unittest import mock
+        from teams.utils import transfermarkt
+
+        html = '<html><head><link rel="canonical" href="/fc-barcelona/startseite/verein/131"></head><h1>FC Barcelona</h1></html>'
+        with mock.patch.object(transfermarkt, '_safe_get', return_value=html) as fetch:
+            transfermarkt._club_index.clear()
+            first = transfermarkt.parse_club_page('https://www.transfermarkt.com/-/startseite/verein/131')
+            first['name'] = 'changed by caller'
+            again = transfermarkt.parse_club_page('https://www.transfermarkt.com/-/startseite/verein/131')
+            # the same club under its slug, or another of its pages
+            transfermarkt.parse_club_page('https://www.transfermarkt.com/fc-barcelona/startseite/verein/131')
+            transfermarkt.parse_club_page('https://www.transfermarkt.com/fc-barcelona/spielplan/verein/131/saison_id/2025')
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(again['name'], 'FC Barcelona')
+        self.assertEqual(again['url'], 'https://www.transfermarkt.com/fc-barcelona/startseite/verein/131')
+
+    def test_circuit_breaker(self):
+        from teams.utils.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+
+        now = [0.0]
+        breaker = CircuitBreaker('tm', failure_rate=0.5, window=4, min_calls=4, consecutive_failures=10,
+                                 reset_timeout=30, clock=lambda: now[0])
+        for _ in range(3):
+            breaker.before_call()
+            breaker.record_failure()
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+
+        # failures in a row trip it before min_calls is reached
+        in_row = CircuitBreaker('tm', min_calls=20, consecutive_failures=2)
+        in_row.record_failure()
+        in_row.record_success()
+        in_row.record_failure()
+        self.assertEqual(in_row.state, CLOSED)
+        in_row.record_failure()
+        self.assertEqual(in_row.state, OPEN)
+        self.assertRaises(CircuitOpenError, breaker.before_call)
+
+        # after the cooldown a single probe goes through, a failed probe opens it again
+        now[0] = 31
+        self.assertEqual(breaker.state, HALF_OPEN)
+        breaker.before_call()
+        self.assertRaises(CircuitOpenError, breaker.before_call)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+
+        now[0] = 62
+        breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.before_call()
+
+    def test_fixture_store_serves_stale(self):
+        from unittest import mock
+        from django.test import override_settings
+        from teams.utils import fixture_store
+        from teams.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+        team = {'name': 'FC Barcelona', 'url': 'https://www.transfermarkt.com/fc-barcelona/startseite/verein/131'}
+        match = {'home': 'FC Barcelona', 'away': 'Real Madrid', 'datetime': datetime(2025, 10, 26, 15, 15, tzinfo=timezone.utc)}
+        caches = {'fixtures': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+        with override_settings(CACHES=caches), mock.patch.object(fixture_store, 'FIXTURES_TTL', 0), \
+                mock.patch.object(fixture_store, 'fetch_upcoming_matches_for_team', return_value=[match]) as fetch:
+            fresh = fixture_store.get_team_fixtures(team)
+
+            fetch.side_effect = CircuitOpenError('www.transfermarkt.com')
+            matches, entries = fixture_store.get_fixtures_for_teams([team])
+            self.assertEqual(matches, [dict(match, team_name='FC Barcelona')])
+            self.assertTrue(entries['team:131']['stale'])
+            self.assertEqual(entries['team:131']['version'], fresh['version'])
+            self.assertEqual(fixture_store.stale_since(entries), fresh['fetched_at'])
+            self.assertNotEqual(fixture_store.fixtures_fingerprint(entries), fixture_store.fixtures_fingerprint({'team:131': fresh}))
+
+            # without anything stored the team is left out
+            _, entries = fixture_store.get_fixtures_for_teams([{'url': 'https://www.transfermarkt.com/x/startseite/verein/5'}])
+            self.assertEqual(entries, {})
+
+            # once the time budget is spent nothing is fetched any more, stored fixtures are served stale
+            fetch.reset_mock()
+            fetch.side_effect = None
+            _, entries = fixture_store.get_fixtures_for_teams(
+                [team, {'url': 'https://www.transfermarkt.com/x/startseite/verein/5'}], budget=0)
+            fetch.assert_not_called()
+            self.assertEqual(list(entries), ['team:131'])
+            self.assertTrue(entries['team:131']['stale'])
+
+        # a team url the club page is needed for (no name in it): a failed club page fetch serves stale
+        # fixtures too, instead of storing an empty list that would cancel every match
+        from teams.utils import transfermarkt
+        team = {'name': 'FC Barcelona', 'url': 'https://www.transfermarkt.com/fc-barcelona/spielplan/verein/131'}
+        with override_settings(CACHES=caches), mock.patch.object(fixture_store, 'FIXTURES_TTL', 0):
+            fixture_store.store_team_fixtures(team, [match])
+            with mock.patch.object(transfermarkt._club_index, 'get', return_value=None), \
+                    mock.patch.object(transfermarkt, '_safe_get', side_effect=CircuitOpenError('www.transfermarkt.com')):
+                entry = fixture_store.get_team_fixtures(team)
+            self.assertTrue(entry['stale'])
+            self.assertEqual(entry['matches'], [match])
+            self.assertEqual(entry['changes']['cancelled'], [])
+
+            # the next rate limiter slot is past the deadline: nothing is fetched, stale fixtures are served
+            import time
+            from teams.utils.rate_limit import RateLimiter, DeadlineExceeded
+            limiter = RateLimiter(60)
+            limiter.wait()
+            with mock.patch.object(transfermarkt, '_rate_limiter', limiter), \
+                    mock.patch.object(transfermarkt, 'breaker_for', return_value=CircuitBreaker('www.transfermarkt.com')), \
+                    mock.patch.object(transfermarkt, '_breaker_request') as request:
+                started = time.monotonic()
+                entry = fixture_store.get_team_fixtures(
+                    {'url': 'https://www.transfermarkt.com/fc-barcelona/startseite/verein/131'}, deadline=started + 1)
+                self.assertLess(time.monotonic() - started, 1)
+                request.assert_not_called()
+            self.assertTrue(entry['stale'])
+            self.assertRaises(DeadlineExceeded, limiter.wait, time.monotonic() + 1)
+
+    def test_conditional_pages(self):
+        import json
+        from django.test import Client, override_settings
+        from teams.utils import cookie_storage
+
+        teams = []
+        cookie_storage.add_team(teams, 'FC Barcelona', '', 'LaLiga', '')
+        caches = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                  'fixtures': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+        with override_settings(CACHES=caches):
+            client = Client()
+            client.cookies[cookie_storage.COOKIE_NAME] = json.dumps(teams)
+            for path in ('/', '/upcoming/'):
+                # the first response sets the csrf cookie, which is part of the ETag
+                client.get(path)
+                etag = client.get(path)['ETag']
+                self.assertEqual(client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+                self.assertNotIn('Last-Modified', client.get(path))
+
+            # adding a team that is saved already leaves the cookie as it is, but queues a message
+            add = {'name': 'FC Barcelona', 'url': '', 'league': 'LaLiga', 'logo': ''}
+            client.post('/add/', add)
+            client.get('/')
+            etag = client.get('/')['ETag']
+            client.post('/add/', add)
+            response = client.get('/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, 'już istnieje')
+            self.assertEqual(client.get('/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
@@ -7,8 +7,14 @@ urlpatterns = [
     path('', views.team_list, name='team_list'),
     path('search/', views.tm_search, name='search'),
     path('add/', views.add_team_from_tm, name='add'),
+    path('import/', views.bulk_import, name='bulk_import'),
+    path('export/', views.export_teams, name='export'),
     path('upcoming/', views.upcoming_matches, name='upcoming'),
     path('add-to-calendar/', views.add_matches_to_calendar, name='add_to_calendar'),
     path('remove/<str:team_id>/', views.remove_team, name='remove'),
+    path('calendar/<str:team_id>/', views.set_team_calendar, name='set_calendar'),
+    path('logo/<int:size>/', views.team_logo, name='logo'),
+    path('logo/file/<str:digest>.png', views.team_logo_file, name='logo_file'),
+    path('stats/cache/', views.cache_stats, name='cache_stats'),
     path('oauth2callback/', google_calendar.oauth2callback, name='oauth2callback'),
 ]
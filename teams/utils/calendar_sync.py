@@ -0,0 +1,116 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from .fixture_store import team_key, get_snapshot, diff_fixtures, confirmed
+from .google_calendar import create_events_for_matches, CALENDAR_QPS
+from .rate_limit import RateLimiter
+
+SYNC_WORKERS = 4
+
+# One long-lived pool per process: get_calendar_service caches services per thread,
+# so syncs running on the same threads reuse the built services and their transports.
+# Created on first use (and again after a fork), threads don't survive forking.
+_sync_pool = None
+_sync_pool_pid = None
+_sync_pool_lock = threading.Lock()
+
+def _sync_executor():
+    global _sync_pool, _sync_pool_pid
+    with _sync_pool_lock:
+        if _sync_pool is None or _sync_pool_pid != os.getpid():
+            _sync_pool = ThreadPoolExecutor(max_workers=SYNC_WORKERS, thread_name_prefix='calendar-sync')
+            _sync_pool_pid = os.getpid()
+        return _sync_pool
+
+
+def route_team(team, default_calendar_id):
+    """
+    Pick the calendar a team's matches go to: the team's own calendar_id,
+    then a route for its league from settings.CALENDAR_ROUTES, then the default.
+    """
+    routes = getattr(settings, 'CALENDAR_ROUTES', {})
+    return team.get('calendar_id') or routes.get(team.get('league', '')) or default_calendar_id
+
+def plan_calendar_sync(teams, entries, default_calendar_id='primary', synced=None):
+    """
+    Group matches by target calendar.
+    `entries` are fixture store entries keyed by team key (see fixture_store.get_fixtures_for_teams).
+    `synced` ({calendar_id: {team_key: version}}, see synced_versions) makes the plan incremental:
+    teams already synced at their current version are left out, and for the others only
+    fixtures that changed since the synced version are planned (all of them if that snapshot is gone).
+    Returns {calendar_id: {'matches': [...], 'moved': [(old, new)], 'cancelled': [...]}}; moved matches
+    keep their previous version, their event is found at the old kickoff. A match shared by two
+    followed teams is planned once per calendar.
+    """
+    plan = {}
+    seen = set()
+    for team in teams:
+        key = team_key(team)
+        entry = entries.get(key)
+        if not entry:
+            continue
+        calendar_id = route_team(team, default_calendar_id)
+        synced_version = (synced or {}).get(calendar_id, {}).get(key)
+        if synced_version == entry['version']:
+            continue
+
+        previous = get_snapshot(team, synced_version) if synced_version else None
+        if previous is None:
+            upserts, moved, cancelled = confirmed(entry['matches']), [], []
+        else:
+            diff = diff_fixtures(previous, entry['matches'])
+            upserts = confirmed(diff['new']) + diff['confirmed']
+            moved = [(old, new) for old, new in diff['moved'] if new.get('time_known', True)]
+            cancelled = confirmed(diff['cancelled'])
+
+        for kind, items in (('matches', upserts), ('moved', moved), ('cancelled', cancelled)):
+            for item in items:
+                m = item[1] if kind == 'moved' else item
+                match_key = (calendar_id, kind, m.get('url') or (m['home'], m['away'], m['datetime']))
+                if match_key in seen:
+                    continue
+                seen.add(match_key)
+                plan.setdefault(calendar_id, {'matches': [], 'moved': [], 'cancelled': []})[kind].append(item)
+    for calendar_plan in plan.values():
+        calendar_plan['matches'].sort(key=lambda m: m['datetime'])
+        calendar_plan['moved'].sort(key=lambda pair: pair[1]['datetime'])
+    return plan
+
+def synced_versions(teams, entries, default_calendar_id='primary'):
+    """Fixture versions a full sync of `entries` leaves each calendar at: {calendar_id: {team_key: version}}."""
+    versions = {}
+    for team in teams:
+        key = team_key(team)
+        if key in entries:
+            versions.setdefault(route_team(team, default_calendar_id), {})[key] = entries[key]['version']
+    return versions
+
+def sync_calendars(credentials, plan):
+    """
+    Sync every calendar of the plan concurrently, on the process' sync pool.
+    All calendars share one rate limiter, as Google's quota is per user.
+    Returns {calendar_id: {'created', 'updated', 'skipped', 'cancelled', 'error'}};
+    a calendar that fails has its error set, without failing the others.
+    """
+    limiter = RateLimiter(1 / CALENDAR_QPS)
+
+    def sync(calendar_id):
+        summary = {'created': 0, 'updated': 0, 'skipped': 0, 'cancelled': 0, 'error': None}
+        try:
+            results = create_events_for_matches(credentials, plan[calendar_id]['matches'], calendar_id=calendar_id,
+                                                limiter=limiter, cancelled=plan[calendar_id]['cancelled'],
+                                                moved=plan[calendar_id]['moved'])
+        except Exception as e:
+            # HttpError (still rate limited after retries, no access to this calendar), transport errors
+            # and timeouts, RefreshError: reported for this calendar, the others still sync
+            summary['error'] = str(e) or type(e).__name__
+            return summary
+        for r in results:
+            summary[r['action']] += 1
+        return summary
+
+    if not plan:
+        return {}
+    summaries = list(_sync_executor().map(sync, plan))
+    return dict(zip(plan, summaries))
@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+# a host's breaker opens when at least FAILURE_RATE of its last WINDOW calls failed
+# (once MIN_CALLS were made) or its last CONSECUTIVE_FAILURES calls all failed,
+# and lets a probe through again after RESET_TIMEOUT seconds
+FAILURE_RATE = 0.5
+WINDOW = 20
+MIN_CALLS = 5
+# a few timeouts in a row already cost a request most of its time budget, don't wait for MIN_CALLS
+CONSECUTIVE_FAILURES = 3
+RESET_TIMEOUT = 30
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a host whose breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker for one host.
+    closed: calls go through, outcomes are tracked over the last `window` calls;
+            it opens on the failure rate or on `consecutive_failures` failures in a row.
+    open: calls fail fast with CircuitOpenError until `reset_timeout` passes.
+    half-open: a single probe call goes through; success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, name, failure_rate=FAILURE_RATE, window=WINDOW, min_calls=MIN_CALLS,
+                 consecutive_failures=CONSECUTIVE_FAILURES, reset_timeout=RESET_TIMEOUT, clock=time.monotonic):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.consecutive_failures = consecutive_failures
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._outcomes = deque(maxlen=window)
+        self._failures_in_row = 0
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now."""
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+                self._probing = False
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            raise CircuitOpenError(f"{self.name} is not responding, circuit open")
+
+    def record_success(self):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._outcomes.clear()
+                self._probing = False
+            self._outcomes.append(True)
+            self._failures_in_row = 0
+
+    def record_failure(self):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._trip()
+                return
+            self._outcomes.append(False)
+            self._failures_in_row += 1
+            failures = self._outcomes.count(False)
+            if self._failures_in_row >= self.consecutive_failures or \
+                    (len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate):
+                self._trip()
+
+    def _trip(self):
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._probing = False
+        self._outcomes.clear()
+        self._failures_in_row = 0
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def breaker_for(url):
+    """The (process-wide) breaker of the host of `url`."""
+    host = urlparse(url).hostname or ''
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker(host)
+        return breaker
@@ -1,7 +1,46 @@
+import base64
+import binascii
+import hashlib
 import json
-import uuid
+import zlib
+from .transfermarkt import _extract_team_id_from_url
 
 COOKIE_NAME = 'my_teams'
+EXPORT_FIELDS = ('name', 'url', 'league', 'logo', 'calendar_id')
+# browsers drop cookies over 4096 bytes (name, value and attributes together)
+MAX_COOKIE_VALUE_BYTES = 3800
+
+def team_id(name, url):
+    """Cookie id of a team: its Transfermarkt id, or a short hash of the name for teams without one."""
+    tm_id = _extract_team_id_from_url(url or '')
+    return str(tm_id) if tm_id else hashlib.sha1(name.encode('utf-8')).hexdigest()[:10]
+
+def encode_teams(teams):
+    """
+    Cookie value for a list of teams: the EXPORT_FIELDS of every team as a JSON row,
+    deflated and base64url encoded. Ids are not stored, they are derived again on read;
+    crest and club urls share long prefixes, so a league's worth of teams fits in a cookie.
+    """
+    rows = [[t.get(k) or '' for k in EXPORT_FIELDS] for t in teams]
+    data = zlib.compress(json.dumps(rows, separators=(',', ':')).encode('utf-8'), 9)
+    # no '=' padding, it would make the cookie value quoted
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+def decode_teams(value):
+    """Teams from a cookie value written by encode_teams (or by older versions, as plain JSON)."""
+    if value.startswith('['):
+        return json.loads(value)
+    data = zlib.decompress(base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)))
+    teams = []
+    seen = set()
+    for row in json.loads(data):
+        team = dict(zip(EXPORT_FIELDS, row))
+        team['id'] = team_id(team['name'], team['url'])
+        # cookies saved before duplicates were detected by id may hold a club twice
+        if team['id'] not in seen:
+            seen.add(team['id'])
+            teams.append(team)
+    return teams
 
 def get_teams(request):
     """
@@ -12,39 +51,91 @@ def get_teams(request):
     if not cookie_value:
         return []
     try:
-        return json.loads(cookie_value)
-    except json.JSONDecodeError:
+        return decode_teams(cookie_value)
+    except (ValueError, TypeError, binascii.Error, zlib.error):
         return []
 
 def save_teams(response, teams):
     """
     Save the list of teams to the cookie in the response.
+    Returns False (and leaves the cookie as it was) if the teams don't fit in a cookie.
     """
-    response.set_cookie(COOKIE_NAME, json.dumps(teams), max_age=365*24*60*60, samesite='Lax')
+    value = encode_teams(teams)
+    if len(value) > MAX_COOKIE_VALUE_BYTES:
+        return False
+    response.set_cookie(COOKIE_NAME, value, max_age=365*24*60*60, samesite='Lax')
+    return True
 
-def add_team(teams, name, url, league, logo):
+def add_team(teams, name, url, league, logo, calendar_id=''):
     """
     Add a new team to the list if it doesn't exist.
+    calendar_id routes the team's matches to its own Google Calendar (empty = default).
     Returns (team_dict, created_boolean).
     """
-    # Check for duplicates (by name or url)
+    # Check for duplicates (by name or cookie id, the same club under another url has the same id)
+    new_id = team_id(name, url)
     for team in teams:
-        if team['name'] == name or (url and team.get('url') == url):
+        if team['name'] == name or team_id(team['name'], team.get('url')) == new_id:
             return team, False # existing, not created
 
     new_team = {
-        'id': str(uuid.uuid4()),
+        'id': new_id,
         'name': name,
         'url': url,
         'league': league,
-        'logo': logo
+        'logo': logo,
+        'calendar_id': calendar_id
     }
     teams.append(new_team)
     return new_team, True
 
+def set_team_calendar(teams, team_id, calendar_id):
+    """
+    Set the Google Calendar a team's matches are synced to.
+    Returns True if the team was found.
+    """
+    for team in teams:
+        if team.get('id') == team_id:
+            team['calendar_id'] = calendar_id
+            return True
+    return False
+
 def remove_team_by_id(teams, team_id):
     """
     Remove a team by its ID.
     Returns the new list of teams.
     """
     return [t for t in teams if t.get('id') != team_id]
+
+def export_teams(teams):
+    """
+    Serialize teams to JSON for download. Cookie ids are left out,
+    the result can be fed back to parse_exported_teams.
+    """
+    return json.dumps([{k: t.get(k, '') for k in EXPORT_FIELDS} for t in teams], indent=2)
+
+def parse_exported_teams(text):
+    """
+    Parse teams exported by export_teams.
+    Returns a list of dictionaries, or None if the text is not an export.
+    """
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, list) or not all(isinstance(t, dict) and t.get('name') for t in data):
+        return None
+    return data
+
+def add_teams(teams, records):
+    """
+    Add many teams at once (dicts with name, url, league, logo).
+    Returns the number of teams actually created.
+    """
+    created_count = 0
+    for r in records:
+        _, created = add_team(teams, r['name'], r.get('url') or '', r.get('league', ''), r.get('logo', ''),
+                              r.get('calendar_id') or '')
+        if created:
+            created_count += 1
+    return created_count
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.cache import caches
+from .transfermarkt import fetch_upcoming_matches_for_team, _extract_team_id_from_url
+
+FIXTURES_CACHE = 'fixtures'
+# how long fetched fixtures are served before Transfermarkt is asked again (settings.FIXTURES_TTL overrides)
+FIXTURES_TTL = 15 * 60
+# how many past versions of a team's fixtures are kept for diffing
+SNAPSHOTS_KEPT = 10
+# how long the latest change of a team's fixtures is shown in the digest (seconds)
+CHANGES_MAX_AGE = 7 * 24 * 60 * 60
+# seconds a page request may spend fetching fixtures (settings.FIXTURES_FETCH_BUDGET overrides);
+# teams left when it is spent get their stored fixtures (stale) or are skipped.
+# Kept well below gunicorn's worker timeout (gunicorn.conf.py).
+FETCH_BUDGET = 8
+# read timeout of a fixtures fetch on the request path, shorter than transfermarkt.REQUEST_TIMEOUT
+FETCH_TIMEOUT = 4
+# a fetch never gets less time than this, even with the budget almost spent
+MIN_FETCH_TIMEOUT = 1
+
+
+def team_key(team):
+    """Key of a team in the store: its Transfermarkt id, or the url if it has none."""
+    url = team.get('url') or ''
+    team_id = _extract_team_id_from_url(url)
+    return f"team:{team_id}" if team_id else f"url:{url}"
+
+def _store():
+    return caches[FIXTURES_CACHE]
+
+def _snapshot_key(key, version):
+    return f"{key}:v{version}"
+
+def confirmed(matches):
+    """Matches with a known kickoff time (entries also hold fixtures still waiting for one)."""
+    return [m for m in matches if m.get('time_known', True)]
+
+def get_team_fixtures(team, timeout=FETCH_TIMEOUT, fetch=True, deadline=None):
+    """
+    Return the store entry of a team:
+      {'matches', 'version', 'updated_at', 'fetched_at', 'changes'}
+    Fixtures are re-fetched once they are older than FIXTURES_TTL.
+    A new version (and updated_at) is set only when the fetched matches differ
+    from the stored ones, so it can be used to tell whether anything changed;
+    'changes' is the diff against the previous version (see diff_fixtures).
+    If the re-fetch fails (Transfermarkt slow, blocking us, or its circuit breaker open),
+    the stored entry is returned with 'stale': True instead; without one the error is raised.
+    `timeout` is the read timeout of the fetch and `deadline` (time.monotonic()) the latest
+    it may start, waiting for the rate limiter included; with fetch=False nothing is fetched,
+    an expired entry is returned stale and a missing one as None.
+    """
+    key = team_key(team)
+    entry = _store().get(key)
+    now = time.time()
+    if entry and now - entry['fetched_at'] < getattr(settings, 'FIXTURES_TTL', FIXTURES_TTL):
+        return entry
+    if not fetch:
+        return dict(entry, stale=True) if entry else None
+
+    try:
+        matches = fetch_upcoming_matches_for_team(team, include_unconfirmed=True, timeout=timeout, deadline=deadline)
+    except Exception:
+        if not entry:
+            raise
+        # degraded mode: last known fixtures, left as they are so the next request tries again
+        return dict(entry, stale=True)
+    return store_team_fixtures(team, matches, now)
+
+def _without_team_name(matches):
+    # the name a team is followed under depends on where the matches came from (a cookie,
+    # a replayed club page, none for bulk warming); it is added back by get_fixtures_for_teams
+    return [{k: v for k, v in m.items() if k != 'team_name'} for m in matches]
+
+def version_id(matches):
+    """
+    Version of a team's fixtures: a hash of the matches. Unlike a counter it is never reused
+    for other fixtures, even when the cache culls an entry and the team is stored anew.
+    """
+    data = json.dumps(matches, sort_keys=True, default=str)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()[:16]
+
+def store_team_fixtures(team, matches, fetched_at=None):
+    """
+    Put freshly fetched (or replayed) matches of a team into the store.
+    Matches are stored without 'team_name', so fetches from different paths compare equal.
+    Every new version is also kept as a snapshot, the last SNAPSHOTS_KEPT of them
+    (entry['history'] lists their versions, oldest first).
+    Returns the updated entry.
+    """
+    matches = _without_team_name(matches)
+    key = team_key(team)
+    entry = _store().get(key)
+    now = time.time()
+    if entry and _without_team_name(entry['matches']) == matches:
+        entry['fetched_at'] = fetched_at or now
+    else:
+        version = version_id(matches)
+        history = [v for v in (entry or {}).get('history', []) if v != version] + [version]
+        for dropped in history[:-SNAPSHOTS_KEPT]:
+            _store().delete(_snapshot_key(key, dropped))
+        entry = {
+            'matches': matches,
+            'version': version,
+            'history': history[-SNAPSHOTS_KEPT:],
+            'updated_at': now,
+            'fetched_at': fetched_at or now,
+            'changes': diff_fixtures(entry['matches'], matches) if entry else empty_diff(),
+        }
+        _store().set(_snapshot_key(key, version), matches, timeout=None)
+    # kept without expiry, freshness is decided by fetched_at
+    _store().set(key, entry, timeout=None)
+    return entry
+
+def get_snapshot(team, version):
+    """Matches of a team as they were at `version`, or None if that snapshot is gone."""
+    return _store().get(_snapshot_key(team_key(team), version))
+
+def get_fixtures_for_teams(teams, budget=None):
+    """
+    Collect store entries for all teams.
+    Returns (matches with a known kickoff time sorted by datetime, {team_key: entry}).
+    Teams that fail to fetch are left out, unless they have stale fixtures to fall back to.
+    Fetching stops once `budget` seconds (default FETCH_BUDGET) are spent, so a slow
+    Transfermarkt can't hold a request past the worker timeout (a fetch that would wait for
+    the rate limiter past it is skipped too); the remaining teams get their stored fixtures,
+    stale if expired, or are left out.
+    """
+    if budget is None:
+        budget = getattr(settings, 'FIXTURES_FETCH_BUDGET', FETCH_BUDGET)
+    deadline = time.monotonic() + budget
+    matches = []
+    entries = {}
+    for team in teams:
+        remaining = deadline - time.monotonic()
+        try:
+            entry = get_team_fixtures(team, timeout=max(MIN_FETCH_TIMEOUT, min(FETCH_TIMEOUT, remaining)),
+                                      fetch=remaining > 0, deadline=deadline)
+        except Exception as e:
+            # log; continue
+            print(f"Error fetching for {team}: {e}")
+            continue
+        if entry is None:
+            continue
+        entries[team_key(team)] = entry
+        matches.extend(dict(m, team_name=team.get('name', '')) for m in confirmed(entry['matches']))
+    matches.sort(key=lambda m: m['datetime'])
+    return matches, entries
+
+def _has_recent_changes(entry, now=None):
+    return (now or time.time()) - entry['updated_at'] < CHANGES_MAX_AGE
+
+def fixtures_fingerprint(entries, now=None):
+    """Cheap fingerprint of a team set and the fixture versions behind it (and of what the digest shows)."""
+    parts = sorted(
+        f"{key}@{entry['version']}{'~' if entry.get('stale') else ''}{'+' if _has_recent_changes(entry, now) else ''}"
+        for key, entry in entries.items()
+    )
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+def stale_since(entries):
+    """Time (epoch seconds) of the oldest fetch behind stale entries, or None if everything is fresh."""
+    return min((entry['fetched_at'] for entry in entries.values() if entry.get('stale')), default=None)
+
+def _match_key(m):
+    # the match page link carries Transfermarkt's match id
+    return m.get('url') or (m['home'], m['away'], m.get('league'))
+
+def empty_diff():
+    return {'new': [], 'moved': [], 'confirmed': [], 'cancelled': []}
+
+def diff_fixtures(old, new, now=None):
+    """
+    Compare two versions of a team's fixtures.
+    Returns {'new': [match], 'moved': [(old, new)], 'confirmed': [match], 'cancelled': [match]}:
+      - new: fixtures that were not there before
+      - moved: kickoff date or time changed
+      - confirmed: kickoff time became known (it was 'Unknown' / '12:00 AM' before)
+      - cancelled: fixtures that disappeared before they were played
+    """
+    now = now or datetime.now(timezone.utc)
+    diff = empty_diff()
+    old_by_key = {_match_key(m): m for m in old}
+    new_keys = set()
+    for m in new:
+        key = _match_key(m)
+        new_keys.add(key)
+        before = old_by_key.get(key)
+        if before is None:
+            diff['new'].append(m)
+        elif m.get('time_known', True) and not before.get('time_known', True):
+            diff['confirmed'].append(m)
+        elif m['datetime'] != before['datetime']:
+            diff['moved'].append((before, m))
+    for key, m in old_by_key.items():
+        # matches that were played simply leave the fixtures list
+        if key not in new_keys and m['datetime'] > now:
+            diff['cancelled'].append(m)
+    return diff
+
+def merge_changes(entries, now=None):
+    """Combined diff of the latest change of every entry, for a digest; changes older than CHANGES_MAX_AGE are left out."""
+    merged = empty_diff()
+    for entry in entries.values():
+        if not _has_recent_changes(entry, now):
+            continue
+        for kind, items in entry.get('changes', empty_diff()).items():
+            merged[kind].extend(items)
+    return merged
+
+def describe_changes(changes):
+    """
+    Digest items for a diff: [{'kind', 'title', 'match', 'previous'}], e.g. kind 'Moved',
+    title 'FC Barcelona vs Real Madrid', previous being the match before it moved (else None).
+    Kickoffs are left to the template, to be shown in the same time zone as the matches table.
+    """
+    def item(kind, m, previous=None):
+        return {'kind': kind, 'title': f"{m['home']} vs {m['away']}", 'match': m, 'previous': previous}
+
+    items = []
+    items += [item('New', m) for m in changes['new']]
+    items += [item('Moved', new, old) for old, new in changes['moved']]
+    items += [item('Kickoff confirmed', m) for m in changes['confirmed']]
+    items += [item('Cancelled', m) for m in changes['cancelled']]
+    return items
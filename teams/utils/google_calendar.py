@@ -1,26 +1,122 @@
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+# Google client libraries (googleapiclient, google_auth_oauthlib, httplib2...) are heavy to import,
+# so they are imported inside the functions using them; see preload.py for warming them up front.
+import hashlib
+import json
+import threading
+from cachetools import LRUCache
 from django.shortcuts import redirect
 from django.conf import settings
 from django.urls import reverse
 from datetime import datetime, timedelta, timezone
 from TeamsMatchesCalendar import settings
+from .rate_limit import RateLimiter
 
 SCOPES = ['https://www.googleapis.com/auth/calendar.events',
           'https://www.googleapis.com/auth/calendar.readonly']
 # now we're reading it from settings
 #CLIENT_SECRETS_FILE = os.path.join(settings.BASE_DIR, 'credentials.json')
+HTTP_TIMEOUT = 30
+# Google Calendar allows a limited number of queries per second per user
+CALENDAR_QPS = 5
+# googleapiclient retries 403 rateLimitExceeded/userRateLimitExceeded and 429 with exponential backoff
+CALENDAR_NUM_RETRIES = 5
+
+# Process-level caches, so a sync doesn't rebuild the API client every time:
+# - the Calendar discovery document, parsed once from the copy bundled with googleapiclient
+# - Credentials objects per user, so a refreshed token is reused by later requests
+# - built services with their authorized httplib2 transport, per thread (httplib2 is not thread-safe)
+_discovery_doc = None
+_discovery_lock = threading.Lock()
+_credentials_cache = LRUCache(maxsize=256)
+_credentials_lock = threading.Lock()
+_services = threading.local()
+
+def _calendar_discovery_doc():
+    from googleapiclient.discovery_cache import get_static_doc
+    global _discovery_doc
+    with _discovery_lock:
+        if _discovery_doc is None:
+            _discovery_doc = json.loads(get_static_doc('calendar', 'v3'))
+    return _discovery_doc
+
+def credentials_from_session(creds_data):
+    """
+    Return Credentials for the session data, reusing the cached object of the same grant,
+    which may already hold a refreshed token.
+    """
+    from google.oauth2.credentials import Credentials
+    grant = f"{creds_data.get('client_id')}:{creds_data.get('refresh_token') or creds_data.get('token')}"
+    key = hashlib.sha256(grant.encode('utf-8')).hexdigest()
+    with _credentials_lock:
+        creds = _credentials_cache.get(key)
+        if creds is None:
+            creds_data = dict(creds_data)
+            expiry = creds_data.pop('expiry', None)
+            creds = Credentials(**creds_data)
+            if expiry:
+                # google-auth keeps expiry as naive UTC
+                creds.expiry = datetime.fromisoformat(expiry)
+            _credentials_cache[key] = creds
+    return creds
+
+def save_credentials(request, creds):
+    """Store credentials in the session (only touching it when something changed, e.g. after a token refresh)."""
+    creds_data = {
+        'token': creds.token,
+        'refresh_token': creds.refresh_token,
+        'token_uri': creds.token_uri,
+        'client_id': creds.client_id,
+        'client_secret': creds.client_secret,
+        'scopes': creds.scopes,
+        'expiry': creds.expiry.isoformat() if creds.expiry else None,
+    }
+    if request.session.get('google_creds') != creds_data:
+        request.session['google_creds'] = creds_data
+
+def get_calendar_service(credentials):
+    """
+    Return a Calendar API service for the credentials, built once per thread from
+    the static discovery document, with a persistent authorized transport.
+    The transport refreshes the token by itself when it expires.
+    """
+    import httplib2
+    import google_auth_httplib2
+    from googleapiclient.discovery import build_from_document
+    services = getattr(_services, 'cache', None)
+    if services is None:
+        services = _services.cache = LRUCache(maxsize=32)
+    cached = services.get(id(credentials))
+    if cached and cached[0] is credentials:
+        return cached[1]
+    http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+    client_options = None
+    if getattr(settings, 'GOOGLE_CALENDAR_API_ENDPOINT', None):
+        # point the client elsewhere, e.g. at the loadtest stubs
+        client_options = {'api_endpoint': settings.GOOGLE_CALENDAR_API_ENDPOINT}
+    service = build_from_document(_calendar_discovery_doc(), http=http, client_options=client_options)
+    services[id(credentials)] = (credentials, service)
+    return service
 
 def ensure_credentials_for_user(request):
     """
     Checks if credentials are in session; if not, starts auth flow and returns redirect to consent.
+    Expired tokens are refreshed up front and written back to the session.
     Returns dict: {'redirect': HttpResponseRedirect} or {'credentials': creds}
     """
+    from google.auth.exceptions import RefreshError
+    from google.auth.transport.requests import Request
+    from google_auth_oauthlib.flow import Flow
     creds_data = request.session.get('google_creds')
     if creds_data:
-        creds = Credentials(**creds_data)
-        return {'credentials': creds}
+        creds = credentials_from_session(creds_data)
+        try:
+            if creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            save_credentials(request, creds)
+            return {'credentials': creds}
+        except RefreshError:
+            # grant revoked or expired - ask for consent again
+            del request.session['google_creds']
     # start auth flow
     flow = Flow.from_client_secrets_file(
         settings.GOOGLE_CREDENTIALS_FILE,
@@ -32,6 +128,7 @@ def ensure_credentials_for_user(request):
     return {'redirect': redirect(auth_url)}
 
 def oauth2callback(request):
+    from google_auth_oauthlib.flow import Flow
     state = request.session.get('oauth_state')
     flow = Flow.from_client_secrets_file(
         settings.GOOGLE_CREDENTIALS_FILE,
@@ -42,33 +139,74 @@ def oauth2callback(request):
     flow.fetch_token(authorization_response=request.build_absolute_uri())
     creds = flow.credentials
     # save creds in session (demo)
-    request.session['google_creds'] = {
-        'token': creds.token,
-        'refresh_token': creds.refresh_token,
-        'token_uri': creds.token_uri,
-        'client_id': creds.client_id,
-        'client_secret': creds.client_secret,
-        'scopes': creds.scopes
-    }
+    save_credentials(request, creds)
     return redirect(reverse('teams:upcoming'))
 
+def _execute(api_request, limiter):
+    """Execute an API request through the per-user rate limiter, retrying when rate limited."""
+    if limiter:
+        limiter.wait()
+    return api_request.execute(num_retries=CALENDAR_NUM_RETRIES)
+
 def date_treat_as_local(date):
     local_tz = datetime.now(timezone.utc).astimezone().tzinfo
     new_date = datetime(date.year, date.month, date.day, date.hour, date.minute, tzinfo=local_tz)
     return new_date
 
-def create_events_for_matches(credentials, matches, calendar_id='primary'):
+def _list_events(service, calendar_id, time_min, time_max, limiter):
+    """All events of a calendar between time_min and time_max, grouped by summary."""
+    events_by_summary = {}
+    page_token = None
+    while True:
+        page = _execute(service.events().list(
+            calendarId=calendar_id,
+            timeMin=time_min.isoformat(),
+            timeMax=time_max.isoformat(),
+            singleEvents=True,
+            maxResults=2500,
+            pageToken=page_token
+        ), limiter)
+        for e in page.get('items', []):
+            events_by_summary.setdefault(e.get('summary'), []).append(e)
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            return events_by_summary
+
+def _find_event(events_by_summary, summary, dt):
+    """The event of a match: same title, starting within a day of the match."""
+    for e in events_by_summary.get(summary, []):
+        existing_start = e.get('start', {}).get('dateTime')
+        if existing_start and abs(datetime.fromisoformat(existing_start) - dt) <= timedelta(days=1):
+            return e
+    return None
+
+def create_events_for_matches(credentials, matches, calendar_id='primary', limiter=None, cancelled=(), moved=()):
     """
-    Creates or updates match events in Google Calendar.
+    Creates or updates match events in Google Calendar, and deletes events of `cancelled` matches.
     Does not duplicate matches, updates if the time changes.
+    `moved` are (old, new) pairs of rescheduled matches: their event is looked up at the old kickoff,
+    which may be days away from the new one, and moved.
+    Existing events are read with one list call for the whole time span of the matches.
+    Pass a RateLimiter shared by all syncs of one user to stay under CALENDAR_QPS.
     """
-    service = build('calendar', 'v3', credentials=credentials)
+    if limiter is None:
+        limiter = RateLimiter(1 / CALENDAR_QPS)
+    matches = [m for m in matches if m.get('datetime')]
+    cancelled = [m for m in cancelled if m.get('datetime')]
+    moved = [(old, new) for old, new in moved if old.get('datetime') and new.get('datetime')]
+    if not matches and not cancelled and not moved:
+        return []
+    service = get_calendar_service(credentials)
     created_or_updated = []
 
-    for m in matches:
-        dt = m.get('datetime')
-        if not dt:
-            continue
+    # 🔍 1. Fetch events around all the matches at once (old kickoffs of moved matches included)
+    datetimes = [m['datetime'] for m in matches + cancelled] + [m['datetime'] for pair in moved for m in pair]
+    events_by_summary = _list_events(service, calendar_id,
+                                     min(datetimes) - timedelta(days=1), max(datetimes) + timedelta(days=1), limiter)
+
+    upserts = [(m, m['datetime']) for m in matches] + [(new, old['datetime']) for old, new in moved]
+    for m, previous_dt in upserts:
+        dt = m['datetime']
 
         #dt = date_treat_as_local(dt)
         summary = f"{m['home']} - {m['away']}"
@@ -76,39 +214,25 @@ def create_events_for_matches(credentials, matches, calendar_id='primary'):
         start = dt.isoformat()
         end = (dt + timedelta(hours=2)).isoformat()
 
-        # 🔍 1. Search for similar events (on this day)
-        time_min = (dt - timedelta(days=1)).astimezone().isoformat()
-        time_max = (dt + timedelta(days=1)).astimezone().isoformat()
-
-        existing_events = service.events().list(
-            calendarId=calendar_id,
-            timeMin=time_min,
-            timeMax=time_max,
-            q=summary,  # search by match title
-            singleEvents=True
-        ).execute().get('items', [])
-
-        # 🔎 2. Check if the match already exists
-        existing_event = None
-        for e in existing_events:
-            if e.get('summary') == summary:
-                existing_event = e
-                break
+        # 🔎 2. Check if the match already exists (a moved match at its old kickoff, or already moved)
+        existing_event = _find_event(events_by_summary, summary, previous_dt)
+        if existing_event is None and previous_dt != dt:
+            existing_event = _find_event(events_by_summary, summary, dt)
 
         if existing_event:
-            # ⏰ 3. Compare dates
+            # ⏰ 3. Compare dates (as instants, the calendar may report them in another offset)
             existing_start = existing_event['start'].get('dateTime')
-            if existing_start and existing_start != start:
+            if existing_start and datetime.fromisoformat(existing_start) != dt:
                 # Changed time — update
                 existing_event['start'] = {'dateTime': start}
                 existing_event['end'] = {'dateTime': end}
                 existing_event['description'] = f"{league}\nMatch page: {m.get('url', '')}"
 
-                updated = service.events().update(
+                updated = _execute(service.events().update(
                     calendarId=calendar_id,
                     eventId=existing_event['id'],
                     body=existing_event
-                ).execute()
+                ), limiter)
                 created_or_updated.append({'action': 'updated', 'id': updated['id'], 'summary': summary})
             else:
                 # No changes
@@ -121,7 +245,16 @@ def create_events_for_matches(credentials, matches, calendar_id='primary'):
                 'start': {'dateTime': start},
                 'end': {'dateTime': end},
             }
-            created_event = service.events().insert(calendarId=calendar_id, body=event).execute()
+            created_event = _execute(service.events().insert(calendarId=calendar_id, body=event), limiter)
             created_or_updated.append({'action': 'created', 'id': created_event['id'], 'summary': summary})
+            events_by_summary.setdefault(summary, []).append(created_event)
+
+    # 🗑 5. Remove events of cancelled matches
+    for m in cancelled:
+        summary = f"{m['home']} - {m['away']}"
+        existing_event = _find_event(events_by_summary, summary, m['datetime'])
+        if existing_event:
+            _execute(service.events().delete(calendarId=calendar_id, eventId=existing_event['id']), limiter)
+            created_or_updated.append({'action': 'cancelled', 'id': existing_event['id'], 'summary': summary})
 
     return created_or_updated
@@ -0,0 +1,99 @@
+import hashlib
+import io
+import os
+import re
+from pathlib import Path
+from urllib.parse import urlparse
+from django.conf import settings
+from .transfermarkt import guarded_get
+
+# heights the templates ask for (40px crests, doubled for high-dpi screens)
+THUMBNAIL_SIZES = (40, 80)
+# only crests from Transfermarkt and its CDN are proxied, anything else is refused
+ALLOWED_LOGO_HOSTS = ('transfermarkt.com', 'tmssl.akamaized.net')
+# upper bound on cached (url, size) pairs; past it crests are hot-linked instead of cached
+MAX_CACHED_LOGOS = 10000
+
+
+class LogoCacheFull(Exception):
+    pass
+
+
+def is_allowed_logo_url(url):
+    host = urlparse(url).hostname or ''
+    return any(host == h or host.endswith('.' + h) for h in ALLOWED_LOGO_HOSTS)
+
+def normalize_logo_url(url):
+    """
+    Canonical form of a crest url, so variants of it share one cache entry:
+    no query string (Transfermarkt's ?lm= is only a cache buster) or fragment, no doubled slashes.
+    """
+    parsed = urlparse(url)
+    path = re.sub(r'/{2,}', '/', parsed.path)
+    return f"{parsed.scheme.lower()}://{(parsed.hostname or '').lower()}{path}"
+
+def is_digest(value):
+    return bool(re.fullmatch(r'[0-9a-f]{64}', value))
+
+def _cache_dir():
+    return Path(settings.LOGO_CACHE_DIR)
+
+def _write_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+def _index_path(url, size):
+    key = hashlib.sha256(normalize_logo_url(url).encode('utf-8')).hexdigest()
+    return _cache_dir() / 'index' / f"{key}-{size}"
+
+def logo_path(digest):
+    return _cache_dir() / f"{digest}.png"
+
+def make_thumbnail(data, size):
+    """Resize image bytes to fit in a size x size box, returns PNG bytes."""
+    from PIL import Image
+    img = Image.open(io.BytesIO(data))
+    img = img.convert('RGBA')
+    img.thumbnail((size, size), Image.LANCZOS)
+    out = io.BytesIO()
+    img.save(out, format='PNG', optimize=True)
+    return out.getvalue()
+
+def _fetch_logo(url):
+    # through the image host's circuit breaker, a failing CDN answers at once and the view hot-links instead
+    return guarded_get(url).content
+
+def cached_digest(url, size):
+    """Content digest of the thumbnail of a logo if it is cached already, else None (no fetching)."""
+    index = _index_path(url, size)
+    if index.exists():
+        digest = index.read_text().strip()
+        if logo_path(digest).exists():
+            return digest
+    return None
+
+def get_thumbnail(url, size):
+    """
+    Return the content digest of the cached thumbnail of a remote logo,
+    fetching and resizing it only the first time.
+    Thumbnails are stored content-addressed ({digest}.png), so identical crests
+    share one file; a small index maps (normalized url, size) to the digest.
+    Raises LogoCacheFull once MAX_CACHED_LOGOS pairs are indexed.
+    """
+    digest = cached_digest(url, size)
+    if digest:
+        return digest
+
+    index = _index_path(url, size)
+    index_dir = index.parent
+    if index_dir.exists() and sum(1 for _ in os.scandir(index_dir)) >= MAX_CACHED_LOGOS:
+        raise LogoCacheFull(f"{MAX_CACHED_LOGOS} logos cached")
+    thumbnail = make_thumbnail(_fetch_logo(normalize_logo_url(url)), size)
+    digest = hashlib.sha256(thumbnail).hexdigest()
+    path = logo_path(digest)
+    if not path.exists():
+        _write_atomic(path, thumbnail)
+    _write_atomic(index, digest.encode('ascii'))
+    return digest
@@ -0,0 +1,112 @@
+import gzip
+import hashlib
+import mmap
+import os
+import threading
+import time
+from pathlib import Path
+
+# Archive of fetched Transfermarkt pages, so parsers can be re-run over them offline.
+# Layout:
+#   blobs/ab/abcdef....html.gz   page bodies, gzip-compressed, named by sha256 of the content
+#   index.tsv                    one "fetched_at <TAB> sha256 <TAB> url" line per fetch, append-only
+# Identical pages fetched again only add an index line.
+
+INDEX_NAME = 'index.tsv'
+
+
+class PageArchive:
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+
+    @property
+    def index_path(self):
+        return self.root / INDEX_NAME
+
+    def _blob_path(self, digest):
+        return self.root / 'blobs' / digest[:2] / f"{digest}.html.gz"
+
+    def store(self, url, html, fetched_at=None):
+        """Archive a fetched page. Returns the content digest."""
+        data = html.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(gzip.compress(data, compresslevel=6))
+            os.replace(tmp, path)
+        line = f"{fetched_at or time.time():.3f}\t{digest}\t{url}\n"
+        with self._lock:
+            # a single O_APPEND write keeps lines whole across processes
+            fd = os.open(self.index_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode('utf-8'))
+            finally:
+                os.close(fd)
+        return digest
+
+    def load(self, digest):
+        """Return the html of an archived page."""
+        return gzip.decompress(self._blob_path(digest).read_bytes()).decode('utf-8')
+
+    def _parse_line(self, line):
+        fetched_at, digest, url = line.decode('utf-8').rstrip('\n').split('\t', 2)
+        return float(fetched_at), digest, url
+
+    def entries(self):
+        """Yield (fetched_at, digest, url) for every archived fetch, oldest first."""
+        if not self.index_path.exists():
+            return
+        with open(self.index_path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield self._parse_line(line)
+
+    def lookup(self, url):
+        """
+        Return [(fetched_at, digest), ...] of all fetches of `url`, oldest first.
+        The index is memory-mapped and scanned for the url, without parsing every line.
+        """
+        if not self.index_path.exists() or self.index_path.stat().st_size == 0:
+            return []
+        needle = f"\t{url}\n".encode('utf-8')
+        found = []
+        with open(self.index_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = mm.find(needle)
+            while pos != -1:
+                line_start = mm.rfind(b'\n', 0, pos) + 1
+                fetched_at, digest, _ = self._parse_line(mm[line_start:pos + len(needle)])
+                found.append((fetched_at, digest))
+                pos = mm.find(needle, pos + len(needle))
+        return found
+
+    def latest(self):
+        """Return {url: (fetched_at, digest)} of the most recent fetch of every url."""
+        pages = {}
+        for fetched_at, digest, url in self.entries():
+            pages[url] = (fetched_at, digest)
+        return pages
+
+
+_default_archive = None
+
+def get_default_archive():
+    """
+    The archive configured by settings.PAGE_ARCHIVE_DIR, or None when archiving is off
+    (or Django settings are not available).
+    """
+    global _default_archive
+    try:
+        from django.conf import settings
+        root = getattr(settings, 'PAGE_ARCHIVE_DIR', None)
+    except Exception:
+        return None
+    if not root:
+        return None
+    if _default_archive is None or _default_archive.root != Path(root):
+        _default_archive = PageArchive(root)
+        _default_archive.root.mkdir(parents=True, exist_ok=True)
+    return _default_archive
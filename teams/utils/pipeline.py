@@ -0,0 +1,106 @@
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from .page_archive import PageArchive
+from .transfermarkt import (
+    BULK_WORKERS, _safe_get, _extract_team_id_from_url, _extract_team_name_from_url,
+    fixtures_url, parse_club_html, parse_fixtures_html, parse_archived_page,
+)
+
+# Bulk fetch/parse pipeline for large club sets (whole leagues, cache warming).
+# Fetching is I/O bound and runs in threads (still spaced by the shared rate limiter);
+# BeautifulSoup parsing is CPU bound and runs in worker processes, which send back
+# compact records (club metadata dicts, match lists) instead of soups.
+
+# task kinds
+CLUB = 'club'
+FIXTURES = 'fixtures'
+
+
+def _process_context():
+    # parser processes are started while fetcher threads hold locks (rate limiter, urllib3, logging);
+    # forking then can deadlock the children, so they start from a clean process instead
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+def club_tasks(club_urls):
+    """Pipeline tasks fetching the club page of every club: (kind, url, team_id, team_name)."""
+    return [(CLUB, url, _extract_team_id_from_url(url), '') for url in club_urls]
+
+def fixtures_tasks(club_urls):
+    """Pipeline tasks fetching the fixtures page of every club: (kind, url, team_id, team_name)."""
+    tasks = []
+    for club_url in club_urls:
+        team_id = _extract_team_id_from_url(club_url)
+        slug = _extract_team_name_from_url(club_url)
+        if team_id and slug:
+            tasks.append((FIXTURES, fixtures_url(slug, team_id), team_id, ''))
+    return tasks
+
+def parse_page(task, html):
+    """Parse one fetched page in a worker process."""
+    kind, url, team_id, team_name = task
+    if kind == CLUB:
+        return parse_club_html(html, url)
+    return parse_fixtures_html(html, team_id, team_name)
+
+def run_pipeline(tasks, fetch_workers=BULK_WORKERS, processes=None):
+    """
+    Fetch and parse pages of all tasks; parsing starts as soon as a page arrives.
+    Returns (results, failed, stats):
+      results: [(task, record), ...]
+      failed: [(task, error), ...]
+      stats: {'pages', 'bytes', 'elapsed', 'pages_per_second'}
+    """
+    results = []
+    failed = []
+    stats = {'pages': 0, 'bytes': 0}
+    started = time.monotonic()
+
+    def fetch(task):
+        return _safe_get(task[1])
+
+    with ThreadPoolExecutor(max_workers=fetch_workers) as fetchers, ProcessPoolExecutor(max_workers=processes, mp_context=_process_context()) as parsers:
+        fetching = {fetchers.submit(fetch, task): task for task in tasks}
+        parsing = {}
+        for future in as_completed(fetching):
+            task = fetching[future]
+            try:
+                html = future.result()
+            except Exception as e:
+                failed.append((task, e))
+                continue
+            stats['pages'] += 1
+            stats['bytes'] += len(html)
+            parsing[parsers.submit(parse_page, task, html)] = task
+        for future in as_completed(parsing):
+            task = parsing[future]
+            try:
+                results.append((task, future.result()))
+            except Exception as e:
+                failed.append((task, e))
+
+    stats['elapsed'] = time.monotonic() - started
+    stats['pages_per_second'] = stats['pages'] / stats['elapsed'] if stats['elapsed'] else 0.0
+    return results, failed, stats
+
+def _parse_archived(job):
+    root, url, digest = job
+    return parse_archived_page(url, PageArchive(root).load(digest))
+
+def parse_archived_pages(archive, pages, processes=None):
+    """
+    Re-parse archived pages ({url: (fetched_at, digest)}, see PageArchive.latest) in worker processes;
+    decompression happens in the workers too.
+    Yields (url, fetched_at, result or exception).
+    """
+    jobs = [(str(archive.root), url, digest) for url, (_, digest) in pages.items()]
+    with ProcessPoolExecutor(max_workers=processes, mp_context=_process_context()) as parsers:
+        futures = {parsers.submit(_parse_archived, job): job[1] for job in jobs}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = e
+            yield url, pages[url][0], result
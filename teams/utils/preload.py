@@ -0,0 +1,33 @@
+import gc
+
+# Heavy libraries the app imports lazily (on first use) to keep worker boot and manage.py fast.
+HEAVY_MODULES = (
+    'bs4',
+    'requests',
+    'tzlocal',
+    'PIL.Image',
+    'httplib2',
+    'google_auth_httplib2',
+    'google.oauth2.credentials',
+    'google.auth.transport.requests',
+    'google_auth_oauthlib.flow',
+    'googleapiclient.discovery',
+    'googleapiclient.errors',
+)
+
+
+def preload():
+    """
+    Import the lazily loaded libraries and parse the Calendar discovery document up front.
+    Meant for a server's master process (gunicorn preload_app): forked workers then share
+    the warmed modules copy-on-write instead of each importing them on their first request.
+    """
+    import importlib
+    from . import google_calendar
+
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+    google_calendar._calendar_discovery_doc()
+    # move everything loaded so far out of the collector's reach,
+    # so gc passes in the workers don't touch (and copy) the shared pages
+    gc.freeze()
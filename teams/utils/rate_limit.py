@@ -0,0 +1,34 @@
+import threading
+import time
+
+
+class DeadlineExceeded(Exception):
+    """Raised by RateLimiter.wait when the caller's next slot is past its deadline."""
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter spacing calls at least `interval` seconds apart.
+    Shared between threads, so concurrent workers together stay under the rate.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self, deadline=None):
+        """
+        Block until the caller is allowed to make its next call.
+        With a `deadline` (a time.monotonic() value), raise DeadlineExceeded instead of
+        waiting for a slot past it; the slot is left to other callers.
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            if deadline is not None and slot > deadline:
+                raise DeadlineExceeded(f"next call allowed in {slot - now:.2f}s, past the deadline")
+            self._next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
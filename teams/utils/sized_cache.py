@@ -0,0 +1,60 @@
+import sys
+import threading
+from cachetools import TTLCache
+
+
+def approx_size(obj):
+    """Approximate memory footprint of a record made of dicts, lists, tuples and scalars, in bytes."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_size(k) + approx_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(approx_size(v) for v in obj)
+    return size
+
+
+class SizedCache:
+    """
+    Thread-safe LRU cache bounded by the approximate byte size of its values
+    (not by their count), with a time-to-live and hit/miss statistics.
+    Meant for small extracted records, not for whole pages or soups.
+    """
+
+    def __init__(self, max_bytes, ttl):
+        self._cache = TTLCache(maxsize=max_bytes, ttl=ttl, getsizeof=approx_size)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            try:
+                self._cache[key] = value
+            except ValueError:
+                # larger than the whole cache, not worth keeping
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            self._cache.expire()
+            return {
+                'entries': len(self._cache),
+                'bytes': self._cache.currsize,
+                'max_bytes': self._cache.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
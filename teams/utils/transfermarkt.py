@@ -1,17 +1,39 @@
 # teams/utils/transfermarkt.py
+import os
 import re
 import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin, quote, urlparse
 from datetime import datetime, timedelta, timezone
-from tzlocal import get_localzone
-import requests
 import random
-from bs4 import BeautifulSoup
+from .rate_limit import RateLimiter
+from .sized_cache import SizedCache
+from .page_archive import get_default_archive
+from .circuit_breaker import breaker_for
 
-BASE = "https://www.transfermarkt.com"
+# both can be overridden from the environment, e.g. to point the app at local stubs (see loadtest/)
+BASE = os.environ.get('TRANSFERMARKT_BASE', "https://www.transfermarkt.com")
 REQUEST_TIMEOUT = 10
+# a host that doesn't accept the connection quickly is down or dropping us, don't wait REQUEST_TIMEOUT for it
+CONNECT_TIMEOUT = 3.05
+# responses that mean the server is overloaded or blocking us, they count as failures for the circuit breaker
+BREAKER_STATUSES = (403, 429)
+REQUEST_INTERVAL = float(os.environ.get('TRANSFERMARKT_REQUEST_INTERVAL', '0.5'))
+BULK_WORKERS = 4
+# club records extracted from club pages, kept per process
+RECORDS_CACHE_BYTES = 8 * 1024 * 1024
+RECORDS_CACHE_TTL = 24 * 60 * 60
 DEFAULT_TZ = datetime.now(timezone.utc).astimezone().tzinfo
 
+# bs4, requests and tzlocal are imported where they are used, to keep process startup fast
+# (see preload.py for warming them up front)
+
+# one limiter for the whole process, so concurrent lookups stay as polite as serial ones
+_rate_limiter = RateLimiter(REQUEST_INTERVAL)
+
+# club index: club records extracted by parse_club_page, keyed by club url and bounded by size
+_club_index = SizedCache(RECORDS_CACHE_BYTES, RECORDS_CACHE_TTL)
+
 def get_random_user_agent():
     user_agents = [
         'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36',
@@ -27,11 +49,52 @@ def get_headers():
         "Referer": "https://www.google.com"
         }
 
-def _safe_get(url, sleep=0.5):
-    """GET with headers and small delay to be nicer to the server."""
-    time.sleep(sleep)
-    r = requests.get(url, headers=get_headers(), timeout=REQUEST_TIMEOUT)
+def _soup(html):
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, 'html.parser')
+
+def guarded_get(url):
+    """
+    GET with headers through the circuit breaker of the url's host (see circuit_breaker.py).
+    Raises CircuitOpenError without any request while the host is failing;
+    timeouts, connection errors, 403/429 and 5xx responses count as failures.
+    """
+    breaker = breaker_for(url)
+    breaker.before_call()
+    return _breaker_request(url, breaker)
+
+def _breaker_request(url, breaker, timeout=REQUEST_TIMEOUT):
+    import requests
+    try:
+        r = requests.get(url, headers=get_headers(), timeout=(min(CONNECT_TIMEOUT, timeout), timeout))
+    except requests.RequestException:
+        breaker.record_failure()
+        raise
+    if r.status_code in BREAKER_STATUSES or r.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
     r.raise_for_status()
+    return r
+
+def _safe_get(url, timeout=REQUEST_TIMEOUT, deadline=None):
+    """
+    GET with headers, spaced by the shared rate limiter to be nicer to the server.
+    `timeout` is the read timeout; request paths pass a shorter one than bulk jobs.
+    `deadline` (time.monotonic()) bounds the wait for the limiter: rather than queueing
+    past it, rate_limit.DeadlineExceeded is raised and nothing is fetched.
+    """
+    # an open breaker fails fast, before queueing on the limiter
+    breaker = breaker_for(url)
+    breaker.before_call()
+    _rate_limiter.wait(deadline)
+    r = _breaker_request(url, breaker, timeout)
+    archive = get_default_archive()
+    if archive:
+        try:
+            archive.store(url, r.text)
+        except OSError as e:
+            print("_safe_get: error archiving", url, e)
     return r.text
 
 def _extract_team_id_from_url(url):
@@ -48,11 +111,11 @@ def _extract_team_name_from_url(url):
       .../fc-barcelona/startseite/verein/131 or .../real-madrid/transfers/verein/418
     """
     team_url_name = None
-    m = re.search(r'transfermarkt\.com/([^/]+)/startseite/verein/\d+', url)
+    m = re.search(r'/([^/]+)/startseite/verein/\d+', url)
     if m:
         team_url_name = m.group(1)
     else:
-        m = re.search(r'transfermarkt\.com/([^/]+)/transfers/verein/\d+', url)
+        m = re.search(r'/([^/]+)/transfers/verein/\d+', url)
         if m:
             team_url_name = m.group(1)
     return team_url_name
@@ -71,7 +134,7 @@ def search_transfermarkt(query, max_results=10, domain=BASE):
     search_url = f"{domain}/schnellsuche/ergebnis/schnellsuche?query={q}"
     html = _safe_get(search_url)
 
-    soup = BeautifulSoup(html, 'html.parser')
+    soup = _soup(html)
     results = []
     seen = set()
 
@@ -100,13 +163,34 @@ def search_transfermarkt(query, max_results=10, domain=BASE):
     # textual results (some pages render results as JS; then this may fail).
     return results
 
-def parse_club_page(club_url):
+def parse_club_page(club_url, timeout=REQUEST_TIMEOUT, deadline=None):
     """
     Fetch club page and extract: name, url, league, logo.
+    Records are kept in the club index, so a club page is fetched and parsed
+    only once per process (until RECORDS_CACHE_TTL passes or it is evicted).
+    They are keyed by team id, so /-/startseite/verein/131 (a bare id) and
+    /fc-barcelona/startseite/verein/131 share one record.
+    """
+    team_id = _extract_team_id_from_url(club_url)
+    key = f"team:{team_id}" if team_id else club_url
+    meta = _club_index.get(key)
+    if meta is None:
+        meta = parse_club_html(_safe_get(club_url, timeout, deadline), club_url)
+        if not meta:
+            return None
+        _club_index.set(key, meta)
+    return dict(meta)
+
+def club_index_stats():
+    """Size and hit/miss statistics of this process's club index."""
+    return _club_index.stats()
+
+def parse_club_html(html, club_url):
+    """
+    Extract club metadata from club page html (see parse_club_page).
     Robust approach with several fallbacks.
     """
-    html = _safe_get(club_url)
-    soup = BeautifulSoup(html, 'html.parser')
+    soup = _soup(html)
 
     # 1) Name: usually in <h1> (or <div class="dataHeader"> etc.)
     name = None
@@ -152,18 +236,115 @@ def parse_club_page(club_url):
                 league = a.get_text(strip=True)
                 break
 
+    # 4) Url: prefer the canonical club link, so urls built from a bare team id get their name slug
+    url = club_url
+    canonical = soup.find('link', rel='canonical', href=True)
+    if canonical and '/verein/' in canonical['href']:
+        url = urljoin(BASE, canonical['href'])
+
     # final sanity checks
     if not name:
         return None
 
     return {
         'name': name,
-        'url': club_url,
+        'url': url,
         'league': league or '',
         'logo': logo or ''
     }
 
+def club_url_for_id(team_id, domain=BASE):
+    """
+    Build a club url from a bare team id. Transfermarkt ignores the name slug,
+    and parse_club_page picks the real one up from the canonical link.
+    """
+    return f"{domain}/-/startseite/verein/{team_id}"
+
+def _normalize_club_url(url, domain=BASE):
+    """
+    Turn any club page url (.../fc-barcelona/spielplan/verein/131/saison_id/2024)
+    into its start page url (.../fc-barcelona/startseite/verein/131).
+    """
+    m = re.search(r'/([^/]+)/[^/]+/verein/(\d+)', url)
+    if not m:
+        return None
+    return f"{domain}/{m.group(1)}/startseite/verein/{m.group(2)}"
+
+def list_competition_clubs(competition_url, domain=BASE):
+    """
+    Fetch a competition page (/wettbewerb/) and return start page urls of all its clubs.
+    """
+    html = _safe_get(competition_url)
+    soup = _soup(html)
+    clubs = []
+    seen = set()
+    for a in soup.find_all('a', href=True):
+        if '/startseite/verein/' not in a['href']:
+            continue
+        club_url = _normalize_club_url(a['href'], domain)
+        if club_url and club_url not in seen:
+            seen.add(club_url)
+            clubs.append(club_url)
+    return clubs
+
+def expand_bulk_entries(entries, domain=BASE):
+    """
+    Turn bulk input into club urls. An entry can be a club url, a numeric team id
+    or a competition url, which is expanded into all its clubs.
+    Returns (club_urls, invalid_entries); duplicates are dropped.
+    """
+    club_urls = []
+    invalid = []
+    for entry in entries:
+        entry = entry.strip()
+        if not entry:
+            continue
+        if entry.isdigit():
+            found = [club_url_for_id(entry, domain)]
+        elif '/wettbewerb/' in entry:
+            try:
+                found = list_competition_clubs(entry, domain)
+            except Exception as e:
+                print("expand_bulk_entries: error fetching", entry, e)
+                found = []
+        else:
+            club_url = _normalize_club_url(entry, domain)
+            found = [club_url] if club_url else []
+        if not found:
+            invalid.append(entry)
+        for club_url in found:
+            if club_url not in club_urls:
+                club_urls.append(club_url)
+    return club_urls, invalid
+
+def resolve_clubs(entries, max_workers=BULK_WORKERS, domain=BASE):
+    """
+    Resolve many clubs at once (see expand_bulk_entries for accepted entries).
+    Club pages are fetched concurrently through the shared rate limiter and the club index.
+    Returns (clubs, failed): club metadata dicts in input order and entries that did not resolve.
+    """
+    club_urls, failed = expand_bulk_entries(entries, domain)
+
+    def resolve(club_url):
+        try:
+            return parse_club_page(club_url)
+        except Exception as e:
+            print("resolve_clubs: error parsing", club_url, e)
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        metas = list(pool.map(resolve, club_urls))
+
+    clubs = []
+    for club_url, meta in zip(club_urls, metas):
+        if meta:
+            clubs.append(meta)
+        else:
+            failed.append(club_url)
+    return clubs, failed
+
 def process_datetime(date_str, time_str) -> datetime:
+    from tzlocal import get_localzone
     date_split = date_str.split(' ')[1].split('/')
     date_year = int(date_split[2]) + 2000
     date_month = int(date_split[1])
@@ -180,10 +361,13 @@ def process_datetime(date_str, time_str) -> datetime:
     return date_datetime_utc
 
 
-def fetch_upcoming_matches_for_team(team, days_ahead=30, domain=BASE):
+def fetch_upcoming_matches_for_team(team, days_ahead=30, domain=BASE, include_unconfirmed=False, timeout=REQUEST_TIMEOUT,
+                                    deadline=None):
     """
     Given a Team object (with .url attribute) or a club_url string, return upcoming matches list:
-      [{'home','away','datetime' (tz-aware),'url','team_name','team_id'}...]
+      [{'home','away','datetime' (tz-aware),'url','team_name','team_id','time_known'}...]
+    Matches without a known kickoff time are left out unless include_unconfirmed is set.
+    `timeout` is the read timeout of every page fetch, `deadline` bounds their wait for the rate limiter (see _safe_get).
     Strategy:
       - extract team name and id from team.url: /{name}/startseite/{id}
       - construct spielplan url: /{name}/spielplandatum/verein/{id}
@@ -201,50 +385,74 @@ def fetch_upcoming_matches_for_team(team, days_ahead=30, domain=BASE):
         return []
 
     team_id = _extract_team_id_from_url(club_url)
-    if not team_id:
-        # try to fetch club page and re-run extraction
-        try:
-            meta = parse_club_page(club_url)
-            team_id = _extract_team_id_from_url(meta.get('url','')) if meta else None
-        except Exception:
-            team_id = None
-
-    if not team_id:
-        return []
-    
     team_name = _extract_team_name_from_url(club_url)
-    if not team_name:
-        # try to fetch club page and re-run extraction
-        try:
-            meta = parse_club_page(club_url)
-            team_name = _extract_team_name_from_url(meta.get('url','')) if meta else None
-        except Exception:
-            team_name = None
-
-    if not team_name:
+    if not team_id or not team_name:
+        # try to fetch club page (once) and re-run extraction on its canonical url;
+        # a failed fetch is raised like the fixtures fetch below, it is not "no fixtures"
+        meta = parse_club_page(club_url, timeout, deadline)
+        meta_url = meta.get('url', '') if meta else ''
+        team_id = team_id or _extract_team_id_from_url(meta_url)
+        team_name = team_name or _extract_team_name_from_url(meta_url)
+
+    if not team_id or not team_name:
         return []
 
     # construct season-sensitive spielplan URL
     now = datetime.now(DEFAULT_TZ)
     season_year = now.year if now.month >= 7 else now.year - 1  # heuristic: european season start in summer
     candidates = [
-        f"{domain}/{team_name}/spielplandatum/verein/{team_id}"
+        fixtures_url(team_name, team_id, domain)
     ]
 
     html = None
+    error = None
     for url in candidates:
         try:
-            html = _safe_get(url)
+            html = _safe_get(url, timeout, deadline)
             if html and 'No matches' not in html:  # cheap heuristics
                 base_page_url = url
                 break
-        except Exception:
+        except Exception as e:
             html = None
+            error = e
             continue
     if not html:
+        # a failed fetch is not "no fixtures", let the caller keep what it had
+        if error:
+            raise error
         return []
 
-    soup = BeautifulSoup(html, 'html.parser')
+    original_team_name = ''
+    if isinstance(team, dict):
+        original_team_name = team.get('name', '')
+    else:
+        original_team_name = getattr(team, 'name', '')
+
+    matches = parse_fixtures_html(html, team_id, original_team_name, domain)
+    if not include_unconfirmed:
+        matches = [m for m in matches if m['time_known']]
+    return filter_upcoming(matches, days_ahead)
+
+def fixtures_url(team_name, team_id, domain=BASE):
+    """Url of a team's fixtures page (spielplandatum), as used by fetch_upcoming_matches_for_team."""
+    return f"{domain}/{team_name}/spielplandatum/verein/{team_id}"
+
+def filter_upcoming(matches, days_ahead=30):
+    """Keep matches of the next `days_ahead` days, sorted by datetime."""
+    #now = timezone.now()
+    now = datetime.now(DEFAULT_TZ)
+    filtered = [m for m in matches if 0 <= (m['datetime'] - now).days <= days_ahead]
+    # sort by datetime
+    filtered.sort(key=lambda x: x['datetime'])
+    return filtered
+
+def parse_fixtures_html(html, team_id, original_team_name='', domain=BASE):
+    """
+    Extract fixtures from a team's fixtures page html.
+    Fixtures whose kickoff time is not known yet have 'time_known' False.
+    Returns all of them, unfiltered by date (see filter_upcoming).
+    """
+    soup = _soup(html)
 
     matches = []
 
@@ -265,8 +473,9 @@ def fetch_upcoming_matches_for_team(team, days_ahead=30, domain=BASE):
             match_report_or_preview = tds[9].contents[0].attrs.get('title')
             # check if the exact time is already known
             time_is_known = tds[2].text.strip() != 'Unknown' and tds[2].text.strip() != '12:00 AM'
-            if (match_report_or_preview == 'Match preview' and time_is_known):
-                date_datetime = process_datetime(tds[1].text.strip(), tds[2].text.strip())
+            if (match_report_or_preview == 'Match preview'):
+                # fixtures without a kickoff time are kept (at midnight) so a later confirmation can be noticed
+                date_datetime = process_datetime(tds[1].text.strip(), tds[2].text.strip() if time_is_known else '12:00 AM')
                 home_or_away = tds[3].text.strip()
                 opponent = tds[6].find('a').text.strip()
                 home = ''
@@ -281,12 +490,6 @@ def fetch_upcoming_matches_for_team(team, days_ahead=30, domain=BASE):
                     #teams_match = f"{opponent} - {team_name_display}"
                 match_link = f"{domain}{tds[9].find('a').attrs.get('href')}"
                 
-                original_team_name = ''
-                if isinstance(team, dict):
-                    original_team_name = team.get('name', '')
-                else:
-                    original_team_name = getattr(team, 'name', '')
-
                 matches.append({
                     'home': home,
                     'away': away,
@@ -294,7 +497,8 @@ def fetch_upcoming_matches_for_team(team, days_ahead=30, domain=BASE):
                     'datetime': date_datetime,
                     'url': match_link,
                     'team_id': team_id,
-                    'team_name': original_team_name
+                    'team_name': original_team_name,
+                    'time_known': time_is_known
                 })
 
                 #events.append((league, date_datetime, teams_match))
@@ -302,12 +506,17 @@ def fetch_upcoming_matches_for_team(team, days_ahead=30, domain=BASE):
         else:
             league = mecz.find('td').find('img').attrs.get('title')
 
+    return matches
 
-
-    # filter by next X days (days_ahead)
-    #now = timezone.now()
-    now = datetime.now(DEFAULT_TZ)
-    filtered = [m for m in matches if 0 <= (m['datetime'] - now).days <= days_ahead]
-    # sort by datetime
-    filtered.sort(key=lambda x: x['datetime'])
-    return filtered
+def parse_archived_page(url, html, domain=BASE):
+    """
+    Re-run the matching parser over an archived page (see page_archive).
+    Returns ('fixtures', club_url, matches), ('club', club_url, meta),
+    or None for pages that are not parsed (search, competitions).
+    """
+    if '/spielplandatum/verein/' in url:
+        team_id = _extract_team_id_from_url(url)
+        return 'fixtures', _normalize_club_url(url, domain), parse_fixtures_html(html, team_id, '', domain)
+    if '/startseite/verein/' in url:
+        return 'club', url, parse_club_html(html, url)
+    return None
@@ -1,20 +1,67 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import HttpResponse, HttpResponseNotModified, FileResponse, Http404, JsonResponse
 from django.urls import reverse
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_POST, condition
+from django.views.decorators.cache import cache_control
+from django.views.decorators.vary import vary_on_cookie
+from django.conf import settings
 from .utils import cookie_storage
-from .forms import TeamSearchForm
-from .utils.transfermarkt import search_transfermarkt, fetch_upcoming_matches_for_team
-from .utils.google_calendar import create_events_for_matches, ensure_credentials_for_user
+from .forms import TeamSearchForm, BulkImportForm
+from .utils.transfermarkt import search_transfermarkt, resolve_clubs, club_index_stats
+from .utils import logo_cache
+from .utils import fixture_store
+from .utils import calendar_sync
+from .utils.google_calendar import ensure_credentials_for_user, save_credentials
 from django.contrib import messages
 import datetime
+import hashlib
 from django.utils import timezone
 
+def _fingerprint(request, *parts):
+    # the csrf cookie is part of every page fingerprint, rendered forms embed a token derived from it
+    parts = parts + (request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),)
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+def _has_messages(request):
+    # pending messages are shown on the next rendered page, it must not be answered with a 304
+    # (len() doesn't mark them as seen, unlike iterating)
+    return len(messages.get_messages(request)) > 0
+
+def _save_teams(request, response, teams):
+    if cookie_storage.save_teams(response, teams):
+        return True
+    messages.error(request, f'Too many teams to save ({len(teams)}), the change was not saved. '
+                            f'Remove some teams first.')
+    return False
+
+def _upcoming_fixtures(request):
+    # memoized on the request, the conditional-response check and the view share one lookup
+    if not hasattr(request, '_upcoming_fixtures'):
+        teams = cookie_storage.get_teams(request)
+        request._upcoming_fixtures = fixture_store.get_fixtures_for_teams(teams)
+    return request._upcoming_fixtures
+
+def _team_list_etag(request):
+    if _has_messages(request):
+        return None
+    return _fingerprint(request, request.COOKIES.get(cookie_storage.COOKIE_NAME, ''))
+
+def _upcoming_etag(request):
+    if _has_messages(request):
+        return None
+    _, entries = _upcoming_fixtures(request)
+    return _fingerprint(request, fixture_store.fixtures_fingerprint(entries), request.COOKIES.get('calendar_id', ''))
+
+@vary_on_cookie
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_team_list_etag)
 def team_list(request):
     teams = cookie_storage.get_teams(request)
     # Sort by name
     teams.sort(key=lambda x: x['name'])
     form = TeamSearchForm()
-    return render(request, 'teams/team_list.html', {'teams': teams, 'form': form})
+    bulk_form = BulkImportForm()
+    return render(request, 'teams/team_list.html', {'teams': teams, 'form': form, 'bulk_form': bulk_form})
 
 @require_POST
 def tm_search(request):
@@ -24,7 +71,12 @@ def tm_search(request):
     q = form.cleaned_data['q']
     # search_transfermarkt should return a list of dicts:
     # [{'name':..., 'url':..., 'league':..., 'logo':...}, ...]
-    results = search_transfermarkt(q)
+    try:
+        results = search_transfermarkt(q)
+    except Exception as e:
+        # Transfermarkt is failing (or its circuit breaker is open, then this answers at once)
+        print(f"Error searching for {q}: {e}")
+        return render(request, 'teams/search_results.html', {'results': [], 'q': q, 'unavailable': True})
     return render(request, 'teams/search_results.html', {'results': results, 'q': q})
 
 @require_POST
@@ -41,29 +93,61 @@ def add_team_from_tm(request):
     teams = cookie_storage.get_teams(request)
     new_team, created = cookie_storage.add_team(teams, name, url or '', league, logo)
     
+    response = redirect('teams:team_list')
+    if not _save_teams(request, response, teams):
+        return response
     if created:
         messages.success(request, f'Dodano drużynę {new_team["name"]}')
     else:
         messages.info(request, f'Drużyna {new_team["name"]} już istnieje.')
-        
+    return response
+
+@require_POST
+def bulk_import(request):
+    # entries are either an exported teams file or Transfermarkt urls / team ids / competition urls
+    form = BulkImportForm(request.POST)
+    if not form.is_valid():
+        return redirect('teams:team_list')
+    entries = form.cleaned_data['entries']
+
+    records = cookie_storage.parse_exported_teams(entries)
+    failed = []
+    if records is None:
+        records, failed = resolve_clubs(entries.splitlines())
+
+    teams = cookie_storage.get_teams(request)
+    created_count = cookie_storage.add_teams(teams, records)
+
     response = redirect('teams:team_list')
-    cookie_storage.save_teams(response, teams)
+    if _save_teams(request, response, teams):
+        messages.success(request, f'Imported {created_count} new teams ({len(records) - created_count} already saved).')
+    if failed:
+        messages.warning(request, f'Could not resolve: {", ".join(failed)}')
     return response
 
-def upcoming_matches(request):
+def export_teams(request):
     teams = cookie_storage.get_teams(request)
-    matches = []
-    for team in teams:
-        try:
-            team_matches = fetch_upcoming_matches_for_team(team)
-            matches.extend(team_matches)
-        except Exception as e:
-            # log; continue
-            print(f"Error fetching for {team}: {e}")
+    response = HttpResponse(cookie_storage.export_teams(teams), content_type='application/json')
+    response['Content-Disposition'] = 'attachment; filename="my_teams.json"'
+    return response
+
+@vary_on_cookie
+@cache_control(private=True, no_cache=True)
+# no Last-Modified: the page also changes with the team set, cookies and staleness, which the ETag covers
+@condition(etag_func=_upcoming_etag)
+def upcoming_matches(request):
     # Each match dict should contain at least: 'home','away','datetime'(timezone-aware), 'url','team'...
-    matches = sorted(matches, key=lambda m: m['datetime'])
+    matches, entries = _upcoming_fixtures(request)
     calendar_id = request.COOKIES.get('calendar_id', '')
-    return render(request, 'teams/upcoming_matches.html', {'matches': matches, 'calendar_id': calendar_id})
+    # set when Transfermarkt could not be reached and stored fixtures are shown instead
+    stale_since = fixture_store.stale_since(entries)
+    return render(request, 'teams/upcoming_matches.html', {
+        'matches': matches,
+        'calendar_id': calendar_id,
+        'fixtures_fingerprint': fixture_store.fixtures_fingerprint(entries),
+        'changes': fixture_store.describe_changes(fixture_store.merge_changes(entries)),
+        'stale_since': datetime.datetime.fromtimestamp(stale_since, tz=datetime.timezone.utc) if stale_since else None,
+    })
 
 @require_POST
 def add_matches_to_calendar(request):
@@ -74,13 +158,7 @@ def add_matches_to_calendar(request):
 
     # Example: we'll fetch upcoming matches server-side and create events for them.
     teams = cookie_storage.get_teams(request)
-    matches = []
-    for team in teams:
-        try:
-            matches.extend(fetch_upcoming_matches_for_team(team))
-        except Exception:
-            pass
-    matches = sorted(matches, key=lambda m: m['datetime'])
+    _, entries = fixture_store.get_fixtures_for_teams(teams)
 
     # Ensure credentials: this function should check for token in session and if not, return redirect URL
     creds_flow = ensure_credentials_for_user(request)
@@ -96,9 +174,28 @@ def add_matches_to_calendar(request):
     if not calendar_id:
         calendar_id = 'primary'
         
-    created_events = create_events_for_matches(credentials, matches, calendar_id=calendar_id)
-    
-    messages.success(request, f'Added {len(created_events)} events to Google Calendar ({calendar_id}).')
+    # teams with their own calendar (or a league route) go there, the rest to calendar_id;
+    # only fixtures changed since the last sync are pushed, unless a full sync is asked for
+    synced = {} if request.POST.get('full_sync') else request.session.get('synced_fixtures', {})
+    plan = calendar_sync.plan_calendar_sync(teams, entries, default_calendar_id=calendar_id, synced=synced)
+    summaries = calendar_sync.sync_calendars(credentials, plan)
+    # the transport may have refreshed the token during the sync
+    save_credentials(request, credentials)
+
+    for cal_id, versions in calendar_sync.synced_versions(teams, entries, default_calendar_id=calendar_id).items():
+        if not summaries.get(cal_id, {}).get('error'):
+            synced.setdefault(cal_id, {}).update(versions)
+    request.session['synced_fixtures'] = synced
+
+    if not summaries:
+        messages.info(request, 'Google Calendar is up to date.')
+    for cal_id, summary in summaries.items():
+        if summary['error']:
+            messages.error(request, f'Google Calendar ({cal_id}) sync failed: {summary["error"]}')
+        else:
+            messages.success(request, f'Google Calendar ({cal_id}): {summary["created"]} created, '
+                                      f'{summary["updated"]} updated, {summary["skipped"]} unchanged, '
+                                      f'{summary["cancelled"]} removed.')
     response = redirect('teams:upcoming')
     
     # Store the user's input in a cookie. If they used the default 'primary' by leaving it empty,
@@ -112,6 +209,17 @@ def add_matches_to_calendar(request):
     
     return response
 
+@require_POST
+def set_team_calendar(request, team_id):
+    # route one team's matches to its own Google Calendar (empty resets to the default one)
+    teams = cookie_storage.get_teams(request)
+    calendar_id = request.POST.get('calendar_id', '').strip()
+    found = cookie_storage.set_team_calendar(teams, team_id, calendar_id)
+    response = redirect('teams:team_list')
+    if _save_teams(request, response, teams) and found:
+        messages.success(request, f'Calendar {calendar_id or "default"} set.')
+    return response
+
 @require_POST
 def remove_team(request, team_id):
     teams = cookie_storage.get_teams(request)
@@ -128,3 +236,39 @@ def remove_team(request, team_id):
     response = redirect('teams:team_list')
     cookie_storage.save_teams(response, teams)
     return response
+
+def team_logo(request, size):
+    # Caches a resized copy of a team crest (see logo_cache.get_thumbnail) and redirects to it.
+    url = request.GET.get('url', '')
+    if size not in logo_cache.THUMBNAIL_SIZES or not logo_cache.is_allowed_logo_url(url):
+        raise Http404('Unknown logo')
+    try:
+        digest = logo_cache.get_thumbnail(url, size)
+    except Exception as e:
+        # fall back to hot-linking the original crest
+        print(f"Error caching logo {url}: {e}")
+        return redirect(url)
+
+    response = redirect('teams:logo_file', digest=digest)
+    # a crest url keeps pointing at the same thumbnail, but that is not guaranteed forever
+    response['Cache-Control'] = 'public, max-age=86400'
+    return response
+
+def team_logo_file(request, digest):
+    # Serves a cached thumbnail by its content digest, so it never changes (like whitenoise's hashed files).
+    if not logo_cache.is_digest(digest) or not logo_cache.logo_path(digest).exists():
+        raise Http404('Unknown logo')
+    etag = f'"{digest}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(open(logo_cache.logo_path(digest), 'rb'), content_type='image/png')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=315360000, immutable'
+    return response
+
+def cache_stats(request):
+    # in-process caches of the worker answering this request; for debugging and staff only
+    if not (settings.DEBUG or request.user.is_staff):
+        raise Http404('Not found')
+    return JsonResponse({'club_index': club_index_stats()})